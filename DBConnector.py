@@ -1,44 +1,111 @@
+import io
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2 import OperationalError,Error
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_batch, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+# Domyślne parametry połączenia; nadpisuje je sekcja "database" w config.json i zmienne środowiskowe
+DEFAULT_DB_PARAMS = {
+    "host": "195.150.230.208",
+    "port": 5432,
+    "user": "z06",
+    "password": "z06@2025",
+    "database": "z06",
+}
+# Zmienne środowiskowe mają pierwszeństwo przed konfiguracją
+DB_PARAMS_ENV = {
+    "host": "GOPR_DB_HOST",
+    "port": "GOPR_DB_PORT",
+    "user": "GOPR_DB_USER",
+    "password": "GOPR_DB_PASSWORD",
+    "database": "GOPR_DB_NAME",
+}
+
+
+# Nazwy instrukcji przygotowanych (PREPARE) w każdym połączeniu; połączenia z puli są
+# używane przez różne obiekty DBConnector, więc stan trzymamy przy połączeniu, a nie przy obiekcie
+_prepared_statements = weakref.WeakKeyDictionary()
+
+
+def load_db_params(config=None):
+    """
+    Zwraca parametry połączenia z bazą.
+
+    Args:
+        config (dict, opcjonalnie): Konfiguracja scenariusza; używana jest jej sekcja "database".
+
+    Returns:
+        dict: Parametry dla psycopg2.connect (host, port, user, password, database).
+    """
+    params = dict(DEFAULT_DB_PARAMS)
+    params.update((config or {}).get("database", {}))
+    for key, env_name in DB_PARAMS_ENV.items():
+        if os.environ.get(env_name):
+            params[key] = os.environ[env_name]
+    params["port"] = int(params["port"])
+    return params
+
+
+def _copy_value(value):
+    """Zamienia wartość na pole formatu tekstowego COPY (NULL jako \\N, z ucieczką znaków specjalnych)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    return (text.replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+
 
 class DBConnector:
-    # Database connection parameters as class constants
-    HOST = "195.150.230.208"
-    PORT = 5432
-    USER = "z06"
-    PASSWORD = "z06@2025"
-    DATABASE = "z06"
-
-    def __init__(self):
+    def __init__(self, verbose=False, params=None, pool=None):
         self.connection = None
+        self.params = params  # parametry połączenia (domyślnie load_db_params())
+        self.pool = pool  # ConnectionPool, z którego pobierane jest połączenie (zamiast własnego)
+        self.verbose = verbose  # komunikaty o każdym zapytaniu i transakcji (błędy wypisywane są zawsze)
+        self.transaction_depth = 0  # zagnieżdżenie begin(); zatwierdzamy dopiero przy zamknięciu najbardziej zewnętrznej
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    @property
+    def in_transaction(self):
+        """Czy trwa jednostka pracy (między begin() a commit()/rollback() zapytania nie są zatwierdzane)."""
+        return self.transaction_depth > 0
 
     def connect(self):
 
         if self.connection is None:
             try:
-                self.connection = psycopg2.connect(
-                    host=self.HOST,
-                    port=self.PORT,
-                    user=self.USER,
-                    password=self.PASSWORD,
-                    database=self.DATABASE
-                )
-                print("Database connection established.")
+                if self.pool:
+                    self.connection = self.pool.getconn()
+                else:
+                    self.connection = psycopg2.connect(**(self.params or load_db_params()))
+                self.log("Database connection established.")
             except OperationalError as e:
                 print(f"Failed to connect to database: {e}")
                 raise
         else:
-            print("Connection already open.")
+            self.log("Connection already open.")
 
     def disconnect(self):
 
         if self.connection:
-            self.connection.close()
+            if self.pool:
+                self.pool.putconn(self.connection)
+            else:
+                self.connection.close()
             self.connection = None
-            print("Database connection closed.")
+            self.transaction_depth = 0
+            self.log("Database connection closed.")
         else:
-            print("No open connection to close.")
+            self.log("No open connection to close.")
 
     def execute_query(self, query, params=None, fetch=False,use_execute_values=False):
         """
@@ -58,7 +125,8 @@ class DBConnector:
                    None: W innych przypadkach lub jeśli wystąpił błąd.
 
                Raises:
-                   psycopg2.Error: W razie problemu z wykonaniem zapytania.
+                   psycopg2.Error: W razie problemu z wykonaniem zapytania wewnątrz
+                       transakcji (begin()) - transakcja jest wtedy wycofywana.
                """
         if self.connection is None:
             print("No database connection. Use connect() first.")
@@ -67,7 +135,8 @@ class DBConnector:
         try:
             with self.connection.cursor() as cursor:
                 if use_execute_values:
-                    execute_values(cursor, query, params)
+                    # Cała lista w jednym zapytaniu (domyślnie execute_values dzieli ją po 100 wierszy)
+                    execute_values(cursor, query, params, page_size=max(len(params), 1))
                 elif isinstance(params, list) and params and isinstance(params[0], (list, tuple)):
                     cursor.executemany(query, params)
                 else:
@@ -75,39 +144,195 @@ class DBConnector:
 
                 if fetch:
                     return cursor.fetchall()
-                else:
+                elif not self.in_transaction:
                     self.connection.commit()
-                    print("Query executed and committed.")
+                    self.log("Query executed and committed.")
         except Error as e:
             print(f"Error executing query: {e}")
+            failed_transaction = self.in_transaction
+            self.rollback()
+            if failed_transaction:
+                raise
+            return None
+
+    def copy_rows(self, table, columns, rows):
+        """
+        Wczytuje wiersze do tabeli przez COPY ... FROM STDIN z bufora w pamięci.
+
+        Args:
+            table (str): Pełna nazwa tabeli, np. "simulation_gopr.location".
+            columns (list of str): Kolumny w kolejności wartości w wierszach.
+            rows (list of tuples): Wiersze do wczytania.
+
+        Returns:
+            int: Liczba wczytanych wierszy lub None, jeśli wystąpił błąd.
+        """
+        if self.connection is None:
+            print("No database connection. Use connect() first.")
+            return None
+        if not rows:
+            return 0
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+            if not self.in_transaction:
+                self.connection.commit()
+            self.log(f"Copied {len(rows)} rows into {table}.")
+            return len(rows)
+        except Error as e:
+            print(f"Error copying rows: {e}")
+            failed_transaction = self.in_transaction
+            self.rollback()
+            if failed_transaction:
+                raise
+            return None
+
+    def execute_prepared(self, name, query, rows):
+        """
+        Wykonuje instrukcję przygotowaną po stronie serwera dla każdego wiersza.
+
+        Przy pierwszym użyciu w danym połączeniu instrukcja jest rejestrowana przez PREPARE,
+        a później wysyłane są już tylko parametry (EXECUTE), po wiele w jednym zapytaniu.
+
+        Args:
+            name (str): Nazwa instrukcji, unikalna dla danej treści zapytania.
+            query (str): Treść zapytania z parametrami $1, $2, ...
+            rows (list of tuples): Parametry kolejnych wykonań.
+
+        Returns:
+            int: Liczba wykonań lub None, jeśli wystąpił błąd.
+        """
+        if self.connection is None:
+            print("No database connection. Use connect() first.")
+            return None
+        if not rows:
+            return 0
+
+        try:
+            with self.connection.cursor() as cursor:
+                prepared = _prepared_statements.setdefault(self.connection, set())
+                if name not in prepared:
+                    cursor.execute(f"PREPARE {name} AS {query}")
+                    prepared.add(name)
+                placeholders = ", ".join(["%s"] * len(rows[0]))
+                execute_batch(cursor, f"EXECUTE {name} ({placeholders})", rows, page_size=max(len(rows), 1))
+            if not self.in_transaction:
+                self.connection.commit()
+            self.log(f"Executed prepared statement {name} {len(rows)} times.")
+            return len(rows)
+        except Error as e:
+            print(f"Error executing prepared statement {name}: {e}")
+            failed_transaction = self.in_transaction
             self.rollback()
+            if failed_transaction:
+                raise
             return None
 
     def begin(self):
-        """Rozpoczyna nową transakcję (jeśli autocommit jest włączony)."""
+        """
+        Rozpoczyna jednostkę pracy - kolejne zapytania są zatwierdzane dopiero przez commit().
+
+        Wywołania mogą się zagnieżdżać: zatwierdza dopiero commit() odpowiadający
+        najbardziej zewnętrznemu begin().
+        """
         if self.connection:
-            self.connection.autocommit = False
-            print("Transaction started.")
+            self.transaction_depth += 1
+            self.log(f"Transaction started (depth {self.transaction_depth}).")
         else:
             print("No open connection to start transaction.")
 
     def commit(self):
-        """Zatwierdza bieżącą transakcję."""
+        """Zamyka jednostkę pracy; zatwierdza zmiany, jeśli była najbardziej zewnętrzna."""
+        if self.connection:
+            if self.transaction_depth > 1:
+                self.transaction_depth -= 1
+                return
+            self.transaction_depth = 0
+            self.flush()
+
+    def flush(self):
+        """Jawny punkt zatwierdzenia: zatwierdza dotychczasowe zmiany, nie zamykając jednostki pracy."""
         if self.connection:
             try:
                 self.connection.commit()
-                print("Transaction committed.")
+                self.log("Transaction committed.")
             except Error as e:
                 print(f"Error committing transaction: {e}")
                 self.rollback()
                 raise
 
     def rollback(self):
-        """Wycofuje bieżącą transakcję."""
+        """Wycofuje bieżącą transakcję wraz ze wszystkimi zagnieżdżonymi jednostkami pracy."""
         if self.connection:
+            self.transaction_depth = 0
             try:
                 self.connection.rollback()
-                print("Transaction rolled back.")
+                self.log("Transaction rolled back.")
             except Error as e:
                 print(f"Error during rollback: {e}")
-                raise
\ No newline at end of file
+                raise
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Grupuje wszystkie zapytania z bloku with w jedną transakcję.
+
+        Przy wyjątku transakcja jest wycofywana, a wyjątek zgłaszany dalej.
+        Bloki mogą się zagnieżdżać - zatwierdza dopiero najbardziej zewnętrzny.
+        """
+        self.begin()
+        try:
+            yield self
+        except Exception:
+            if self.in_transaction:
+                self.rollback()
+            raise
+        else:
+            if self.in_transaction:
+                self.commit()
+
+
+class ConnectionPool:
+    """
+    Pula połączeń z bazą współdzielona przez wątki symulacji.
+
+    Każdy wątek dostaje własny DBConnector (connector()), a wątki zapisujące w tle mogą
+    pobrać osobne połączenia (new_connector()), więc żadne połączenie nie jest używane
+    jednocześnie przez dwa wątki. Połączenia są otwierane dopiero przy pierwszym użyciu.
+    """
+
+    def __init__(self, params=None, max_connections=8, verbose=False):
+        self.params = params or load_db_params()
+        self.verbose = verbose
+        self.pool = ThreadedConnectionPool(0, max_connections, **self.params)
+        self.local = threading.local()
+
+    def getconn(self):
+        return self.pool.getconn()
+
+    def putconn(self, connection):
+        if not self.pool.closed:
+            self.pool.putconn(connection)
+
+    def connector(self):
+        """Zwraca DBConnector bieżącego wątku (ten sam przy kolejnych wywołaniach w danym wątku)."""
+        if getattr(self.local, "db", None) is None:
+            self.local.db = self.new_connector()
+        return self.local.db
+
+    def new_connector(self):
+        """Zwraca nowy, niezależny DBConnector korzystający z tej puli."""
+        return DBConnector(verbose=self.verbose, pool=self)
+
+    def close(self):
+        """Zamyka wszystkie połączenia puli."""
+        if not self.pool.closed:
+            self.pool.closeall()
+        self.local = threading.local()
@@ -2,6 +2,10 @@ import random
 from datetime import datetime
 from datetime import timedelta
 
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
 def create_animal_location(animal_id, longitude, latitude, timestamp):
     """
     Tworzy słownik reprezentujący lokalizację zwierzęcia.
@@ -154,14 +158,17 @@ def generate_route_with_path(animal_id, start_time, end_time, num_points, path_p
     # Wyliczamy, w których pozycjach trasy wstawimy punkty ścieżki.
     num_path_points = len(path_points)
     # Rozkładamy punkty ścieżki równomiernie w całej trasie.
-    path_indices = [int(i * (num_points - 1) / (num_path_points - 1)) for i in range(num_path_points)]
+    # Słownik indeks trasy -> indeks punktu ścieżki (pierwsze wystąpienie), by nie przeszukiwać listy w pętli.
+    path_indices = {}
+    for path_idx, i in enumerate(path_point_indices(num_points, num_path_points)):
+        path_indices.setdefault(i, path_idx)
 
     for i in range(num_points):
         point_time = start_time + timedelta(seconds=i * interval)
         # Jeśli aktualny indeks jest jednym z wyznaczonych dla ścieżki – wstaw punkt ze ścieżki.
         if i in path_indices:
-            # Znajdujemy odpowiadający indeks w liście path_points
-            path_idx = path_indices.index(i)
+            # Odpowiadający indeks w liście path_points
+            path_idx = path_indices[i]
             lon = path_points[path_idx]["longitude"]
             lat = path_points[path_idx]["latitude"]
         else:
@@ -177,4 +184,229 @@ def generate_route_with_path(animal_id, start_time, end_time, num_points, path_p
             "latitude": lat
         })
 
-    return {"route": route}
\ No newline at end of file
+    return {"route": route}
+
+
+def path_point_indices(num_points, num_path_points):
+    """Indeksy punktów trasy, na które równomiernie rozkładane są punkty ścieżki."""
+    if num_path_points == 1:
+        return [0]
+    return [int(i * (num_points - 1) / (num_path_points - 1)) for i in range(num_path_points)]
+
+
+def generate_routes_batch(start_time, end_time, num_points, start_longitudes, start_latitudes,
+                          paths=None, rng=None):
+    """
+    Generuje trasy wielu zwierząt naraz jako tablice NumPy.
+
+    Odpowiada wielokrotnemu wywołaniu generate_route_for_animal (gdy ścieżka zwierzęcia
+    to None) lub generate_route_with_path (gdy podano listę punktów ścieżki), ale cały
+    losowy spacer liczony jest jedną operacją na tablicach.
+
+    Args:
+        start_time (datetime): Czas rozpoczęcia tras.
+        end_time (datetime): Czas zakończenia tras.
+        num_points (int): Liczba punktów każdej trasy.
+        start_longitudes (list): Startowe długości geograficzne (None = losowa).
+        start_latitudes (list): Startowe szerokości geograficzne (None = losowa).
+        paths (list, opcjonalnie): Dla każdego zwierzęcia lista punktów ścieżki do wymuszenia albo None.
+        rng (np.random.Generator, opcjonalnie): Generator liczb losowych.
+
+    Returns:
+        tuple: (czasy punktów w sekundach od EPOCH - tablica (num_points,),
+                długości - tablica (liczba zwierząt, num_points),
+                szerokości - tablica (liczba zwierząt, num_points)).
+    """
+    if num_points < 2:
+        raise ValueError("Liczba punktów musi być co najmniej 2")
+    rng = rng if rng is not None else np.random.default_rng()
+    n = len(start_longitudes)
+    paths = paths if paths is not None else [None] * n
+
+    start = to_seconds(start_time)
+    interval = (end_time - start_time).total_seconds() / (num_points - 1)
+    times = start + np.arange(num_points) * interval
+
+    base_lon = np.array([v if v is not None else np.nan for v in start_longitudes], dtype=float)
+    base_lat = np.array([v if v is not None else np.nan for v in start_latitudes], dtype=float)
+    missing = np.isnan(base_lon)
+    base_lon[missing] = rng.uniform(100.0, 1000.0, missing.sum())
+    missing = np.isnan(base_lat)
+    base_lat[missing] = rng.uniform(100.0, 1000.0, missing.sum())
+
+    steps_lon = rng.uniform(-20.0, 20.0, (n, num_points))
+    steps_lat = rng.uniform(-20.0, 20.0, (n, num_points))
+
+    # Zwierzęta z tą samą ścieżką obsługujemy razem
+    groups = {}
+    for row, path in enumerate(paths):
+        if path:
+            groups.setdefault(id(path), (path, []))[1].append(row)
+
+    forced = []
+    for path, rows in groups.values():
+        if num_points < len(path):
+            raise ValueError("Liczba punktów trasy nie może być mniejsza niż liczba punktów ścieżki.")
+        indices, first = np.unique(path_point_indices(num_points, len(path)), return_index=True)
+        rows = np.array(rows)
+        # W punktach ścieżki spacer losowy nie wykonuje kroku
+        steps_lon[np.ix_(rows, indices)] = 0.0
+        steps_lat[np.ix_(rows, indices)] = 0.0
+        path_lon = np.array([path[i]["longitude"] for i in first], dtype=float)
+        path_lat = np.array([path[i]["latitude"] for i in first], dtype=float)
+        forced.append((rows, indices, path_lon, path_lat))
+
+    lons = base_lon[:, None] + np.cumsum(steps_lon, axis=1)
+    lats = base_lat[:, None] + np.cumsum(steps_lat, axis=1)
+    for rows, indices, path_lon, path_lat in forced:
+        lons[np.ix_(rows, indices)] = path_lon
+        lats[np.ix_(rows, indices)] = path_lat
+
+    return times, lons, lats
+
+
+def path_sweep(path, cursor, direction):
+    """
+    Jedno pełne przejście ścieżki od punktu cursor w kierunku direction, z odbiciem na jej końcach.
+
+    Returns:
+        tuple: (punkty przejścia - zaczynając od path[cursor], indeks ostatniego punktu, kierunek na końcu).
+    """
+    indices = [cursor]
+    for _ in range(len(path) - 1):
+        if not 0 <= cursor + direction < len(path):
+            direction = -direction
+        cursor += direction
+        indices.append(cursor)
+    return [path[i] for i in indices], cursor, direction
+
+
+def to_seconds(dt):
+    """Zamienia datetime na liczbę sekund od EPOCH (bez uwzględniania strefy czasowej)."""
+    return (dt - EPOCH).total_seconds()
+
+
+class AnimalTracks:
+    """
+    Trasy wszystkich zwierząt w postaci tablic NumPy (wiersz = zwierzę) o wspólnej osi czasu.
+
+    Czasy punktów są liczbami (sekundy od EPOCH), a położenie wszystkich zwierząt w danej chwili
+    wyznaczane jest jednym wywołaniem locate(). Odcinek osi czasu, w którym wypada dana chwila,
+    jest wspólny dla wszystkich zwierząt (kursor), więc wyszukuje się go raz na wywołanie.
+    """
+
+    def __init__(self, animal_ids, times, lons, lats):
+        self.animal_ids = list(animal_ids)
+        self.time_axis = np.asarray(times, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.cursor = 0
+
+    def locate(self, current_time):
+        """
+        Wyznacza położenie wszystkich zwierząt w danej chwili (interpolacja liniowa).
+
+        Returns:
+            tuple: (tablica długości, tablica szerokości) w kolejności animal_ids.
+        """
+        t = to_seconds(current_time)
+        last = max(len(self.time_axis) - 2, 0)
+        c = min(max(int(np.searchsorted(self.time_axis, t, side="right")) - 1, 0), last)
+        self.cursor = c
+        nxt = min(c + 1, len(self.time_axis) - 1)
+
+        t1, t2 = self.time_axis[c], self.time_axis[nxt]
+        factor = min(max((t - t1) / (t2 - t1), 0.0), 1.0) if t2 > t1 else 0.0
+        lons = self.lons[:, c] + factor * (self.lons[:, nxt] - self.lons[:, c])
+        lats = self.lats[:, c] + factor * (self.lats[:, nxt] - self.lats[:, c])
+        return lons, lats
+
+    def extend(self, times, lons, lats):
+        """Dokleja na końcu kolejny fragment tras (tablice jak z generate_routes_batch)."""
+        self.time_axis = np.concatenate([self.time_axis, times])
+        self.lons = np.concatenate([self.lons, lons], axis=1)
+        self.lats = np.concatenate([self.lats, lats], axis=1)
+
+    def drop_passed(self, min_points=1):
+        """Usuwa punkty, które zwierzęta już minęły (jeśli jest ich co najmniej min_points)."""
+        k = self.cursor
+        if k < min_points:
+            return
+        self.time_axis = self.time_axis[k:].copy()
+        self.lons = self.lons[:, k:].copy()
+        self.lats = self.lats[:, k:].copy()
+        self.cursor = 0
+
+
+class AnimalTrajectoryStream:
+    """
+    Trasy zwierząt generowane strumieniowo, fragmentami o długości chunk.
+
+    Trasy są dobudowywane z wyprzedzeniem lookahead względem czasu symulacji, a odcinki
+    już minięte są usuwane, więc zużycie pamięci zależy od okna wyprzedzenia, a nie od
+    czasu trwania symulacji. Zwierzę ze ścieżką (paths) chodzi po niej tam i z powrotem: każdy
+    fragment przechodzi ją w całości, zaczynając od punktu, na którym skończył się poprzedni.
+    """
+
+    def __init__(self, animal_ids, start_time, start_longitudes, start_latitudes, paths=None,
+                 points_per_hour=100, chunk=timedelta(hours=1), lookahead=timedelta(hours=1), rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.paths = paths
+        self.chunk = chunk
+        self.lookahead = lookahead
+        # Każdy fragment (razem z punktem wspólnym z poprzednim) musi pomieścić wszystkie punkty wymuszanej ścieżki
+        longest_path = max((len(path) for path in paths or [] if path), default=0)
+        self.points_per_chunk = max(2, longest_path,
+                                    int(round(points_per_hour * chunk.total_seconds() / 3600)))
+        self.end_time = start_time + chunk
+        # Kursor na ścieżce (indeks punktu na końcu ostatniego fragmentu) i kierunek marszu - wspólne
+        # dla zwierząt z tą samą ścieżką, bo wszystkie zaczynają ją jednocześnie
+        self.path_cursors = {id(path): (len(path) - 1, 1) for path in paths or [] if path}
+
+        times, lons, lats = generate_routes_batch(start_time, self.end_time, self.points_per_chunk,
+                                                  start_longitudes, start_latitudes, paths=paths, rng=self.rng)
+        self.tracks = AnimalTracks(animal_ids, times, lons, lats)
+
+    def _next_sweeps(self):
+        """Zwraca ścieżki do wymuszenia w kolejnym fragmencie, kontynuowane od kursorów, i przesuwa kursory."""
+        if self.paths is None:
+            return None
+        sweeps = {}
+        for path in self.paths:
+            if path and id(path) not in sweeps:
+                cursor, direction = self.path_cursors[id(path)]
+                sweeps[id(path)], cursor, direction = path_sweep(path, cursor, direction)
+                self.path_cursors[id(path)] = (cursor, direction)
+        return [sweeps[id(path)] if path else None for path in self.paths]
+
+    def _extend(self):
+        """
+        Dobudowuje jeden fragment tras. Fragment jest generowany od ostatnich punktów (pierwszy punkt
+        pokrywa się z końcem poprzedniego fragmentu i jest odrzucany), a ścieżki są kontynuowane od
+        miejsca, w którym zwierzę je opuściło.
+        """
+        times, lons, lats = generate_routes_batch(
+            self.end_time, self.end_time + self.chunk, self.points_per_chunk,
+            self.tracks.lons[:, -1].tolist(), self.tracks.lats[:, -1].tolist(),
+            paths=self._next_sweeps(), rng=self.rng
+        )
+        self.tracks.extend(times[1:], lons[:, 1:], lats[:, 1:])
+        self.end_time += self.chunk
+
+    def locate(self, current_time):
+        """
+        Wyznacza położenie wszystkich zwierząt, w razie potrzeby dobudowując trasy
+        i usuwając odcinki już minięte.
+
+        Returns:
+            tuple: (tablica długości, tablica szerokości) w kolejności animal_ids.
+        """
+        while self.end_time < current_time + self.lookahead:
+            self._extend()
+        lons, lats = self.tracks.locate(current_time)
+        self.tracks.drop_passed(min_points=self.points_per_chunk)
+        return lons, lats
+
+    def memory_points(self):
+        """Liczba punktów trasy przechowywanych obecnie dla jednego zwierzęcia."""
+        return len(self.tracks.time_axis)
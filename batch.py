@@ -0,0 +1,79 @@
+# Tryb wsadowy (bez GUI) - uruchamia cały scenariusz z config.json tak szybko,
+# jak pozwala sprzęt, bez odmierzania czasu rzeczywistego.
+#
+# python batch.py --config config.json --seed 42
+#
+# Na koniec wypisuje, ile sekund symulacji przypadło na sekundę rzeczywistą.
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+
+import simulation_db
+from simulation import Simulation
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Symulacja GOPR w trybie wsadowym (max speed).")
+    parser.add_argument("--config", default="config.json", help="plik konfiguracji scenariusza")
+    parser.add_argument("--seed", type=int, default=0, help="ziarno generatora liczb losowych")
+    parser.add_argument("--save-to-db", action="store_true", help="zapisuj wyniki do bazy danych")
+    parser.add_argument("--quiet", action="store_true", help="nie wypisuj komunikatów z każdego kroku")
+    parser.add_argument("--precompute-weather", action="store_true",
+                        help="policz pogodę dla całego przebiegu przed startem")
+    parser.add_argument("--export-weather", metavar="PLIK",
+                        help="zapisz policzoną z góry pogodę do pliku .npz (włącza --precompute-weather)")
+    return parser.parse_args(argv)
+
+
+def run_batch(config_file="config.json", seed=0, save_to_db=False, quiet=False,
+              precompute_weather=False, export_weather=None):
+    """
+    Uruchamia pełny scenariusz bez pauz między krokami.
+
+    Returns:
+        dict: Statystyki przebiegu: czas symulowany, czas rzeczywisty i ich stosunek.
+    """
+    random.seed(seed)
+
+    sim = Simulation(config_file)
+    sim.max_speed = True
+    sim.save_to_db = save_to_db
+    sim.precompute_weather = sim.precompute_weather or precompute_weather or bool(export_weather)
+    if save_to_db:
+        sim.db.connect()
+        sim.next_id = simulation_db.allocate_simulation_id(sim.db)
+
+    with open(os.devnull, "w") as devnull, \
+            (contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext()):
+        wall_start = time.perf_counter()
+        sim.start()
+        sim.thread.join()
+        wall_seconds = time.perf_counter() - wall_start
+
+    sim.close_db()
+    if export_weather:
+        sim.weather_tensor.export(export_weather)
+
+    sim_seconds = sim.get_elapsed_time()
+    return {
+        "sim_seconds": sim_seconds,
+        "wall_seconds": wall_seconds,
+        "sim_seconds_per_wall_second": sim_seconds / wall_seconds if wall_seconds > 0 else float("inf"),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = run_batch(args.config, seed=args.seed, save_to_db=args.save_to_db, quiet=args.quiet,
+                      precompute_weather=args.precompute_weather, export_weather=args.export_weather)
+    print(f"[BATCH] Czas symulowany: {stats['sim_seconds']:.0f} s")
+    print(f"[BATCH] Czas rzeczywisty: {stats['wall_seconds']:.2f} s")
+    print(f"[BATCH] Sekundy symulacji na sekundę rzeczywistą: {stats['sim_seconds_per_wall_second']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# Pomiar ruchu do bazy przy zapisie symulacji (save_to_db) bez prawdziwego serwera.
+#
+# python bench_db.py --config config.json --seed 42 --report bench_db_report.json
+#
+# Symulacja działa na podstawionej puli połączeń, która niczego nie wysyła, tylko zlicza
+# zapytania do serwera (round-trips), instrukcje SQL, wiersze i bajty - osobno dla importu mapy,
+# pogody, zwierząt i turystów. Wynik (w przeliczeniu na minutę symulacji) trafia do raportu JSON;
+# z --baseline porównuje go z wcześniejszym raportem i kończy się kodem 1 przy regresji.
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from psycopg2.extensions import adapt
+
+from DBConnector import ConnectionPool
+from simulation import Simulation
+
+# Tabela docelowa -> kategoria raportu; wiersze "location" dostają kategorię reszty transakcji
+TABLE_CATEGORIES = {
+    "map": "map_import",
+    "route": "map_import",
+    "route_point": "map_import",
+    "special_place": "map_import",
+    "special_place_map": "map_import",
+    "bts_station": "map_import",
+    "bts_station_map": "map_import",
+    "weather_station_map": "map_import",
+    "weather_station": "weather",
+    "weather_reading": "weather",
+    "animal": "animals",
+    "simulated_animal": "animals",
+    "animal_location": "animals",
+    "tourist": "tourists",
+    "simulated_tourist": "tourists",
+    "tourist_location": "tourists",
+    "id_high_water": "id_allocation",
+    "simulation": "setup",
+    "simulated_map": "setup",
+}
+METRICS = ("round_trips", "statements", "rows", "bytes")
+TABLE_PATTERN = re.compile(r"simulation_gopr\.(\w+)")
+PREPARED_PATTERN = re.compile(r"EXECUTE (\w+)")
+
+
+def _quote(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return adapt(value).getquoted().decode()
+
+
+class RecordingCursor:
+    """Kursor, który zamiast wykonywać zapytania, przekazuje je do zliczenia połączeniu."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def mogrify(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode()
+        if params is not None:
+            query = query % tuple(_quote(value) for value in params)
+        return query.encode()
+
+    def execute(self, query, params=None):
+        self.result = self.connection.answer(query, params)
+        self.connection.record(self.mogrify(query, params))
+
+    def executemany(self, query, params_list):
+        for params in params_list:
+            self.execute(query, params)
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, file):
+        data = file.read().encode()
+        self.connection.record(sql.encode(), payload=data, rows=data.count(b"\n"))
+
+
+class RecordingConnection:
+    """Udaje połączenie psycopg2: liczy ruch i odpowiada na zapytania o identyfikatory."""
+    encoding = "UTF8"
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.autocommit = False
+        self.closed = 0
+        self.pending = []  # (kategoria lub None dla "location", metryki) do rozliczenia przy commit
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def answer(self, query, params):
+        """Wynik zapytania: tylko rezerwacja identyfikatorów zwraca dane."""
+        if isinstance(query, bytes):
+            query = query.decode()
+        if query.strip().startswith("UPDATE") and "id_high_water" in query:
+            size, table, column, _ = params
+            return [(self.pool.reserve_ids(table, column, size),)]
+        return []
+
+    def record(self, sql, payload=b"", rows=None):
+        text = sql.decode()
+        statements = [s for s in text.split(";") if s.strip()]
+        prepared = PREPARED_PATTERN.findall(text)
+        tables = TABLE_PATTERN.findall(text)
+        if prepared:
+            table = prepared[0][len("insert_"):]
+            rows = len(prepared) if rows is None else rows
+        else:
+            table = tables[0] if tables else None
+        if rows is None:
+            rows = 0
+            if text.lstrip().startswith("INSERT") and "VALUES" in text:
+                rows = text.count("),(") + 1
+        category = None if table == "location" else TABLE_CATEGORIES.get(table, "setup")
+        self.pending.append((category, {
+            "round_trips": 1,
+            "statements": len(statements),
+            "rows": rows,
+            "bytes": len(sql) + len(payload),
+        }))
+
+    def _settle(self, kind):
+        if not self.pending:
+            return  # psycopg2 nie wysyła COMMIT, gdy nie trwa żadna transakcja
+        categories = [c for c, _ in self.pending if c is not None]
+        # Transakcja należy do pierwszej kategorii innej niż rezerwacja identyfikatorów
+        owner = next((c for c in categories if c != "id_allocation"), categories[0] if categories else "setup")
+        for category, metrics in self.pending:
+            self.pool.add(category or owner, metrics)
+        self.pool.add(owner, {"round_trips": 1, "statements": 1, "rows": 0, "bytes": len(kind)})
+        self.pending = []
+
+    def commit(self):
+        self._settle("COMMIT")
+
+    def rollback(self):
+        self._settle("ROLLBACK")
+
+    def close(self):
+        self.closed = 1
+
+
+class RecordingPool(ConnectionPool):
+    """Pula połączeń RecordingConnection, sumująca ruch wszystkich wątków."""
+
+    def __init__(self):
+        self.params = {}
+        self.verbose = False
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.high_water = {}
+        self.totals = {}
+
+    def getconn(self):
+        return RecordingConnection(self)
+
+    def putconn(self, connection):
+        pass
+
+    def close(self):
+        self.local = threading.local()
+
+    def reserve_ids(self, table, column, size):
+        with self.lock:
+            start = self.high_water.get((table, column), 1)
+            self.high_water[(table, column)] = start + size
+            return start
+
+    def add(self, category, metrics):
+        with self.lock:
+            totals = self.totals.setdefault(category, dict.fromkeys(METRICS, 0))
+            for key, value in metrics.items():
+                totals[key] += value
+
+
+def run_benchmark(config_file="config.json", seed=0, parallel_writers=True):
+    """
+    Uruchamia pełny scenariusz z zapisem do bazy na podstawionej puli połączeń.
+
+    Returns:
+        dict: Raport z ruchem do bazy dla każdej kategorii (łącznie i na minutę symulacji).
+    """
+    random.seed(seed)
+
+    pool = RecordingPool()
+    sim = Simulation(config_file)
+    sim.max_speed = True
+    sim.save_to_db = True
+    sim.db_pool = pool
+    # Osobne tory zapisu dla pogody, zwierząt i turystów - każda transakcja dotyczy jednej kategorii
+    sim.db_parallel_writers = parallel_writers
+    # Paczki zapisu tylko według liczby wierszy, nie czasu rzeczywistego - wynik nie zależy od szybkości maszyny
+    sim.db_flush_seconds = 24 * 3600
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        wall_start = time.perf_counter()
+        sim.start()
+        sim.thread.join()
+        wall_seconds = time.perf_counter() - wall_start
+
+    sim_minutes = sim.get_elapsed_time() / 60
+    categories = {}
+    for category, totals in sorted(pool.totals.items()):
+        categories[category] = {
+            "total": totals,
+            "per_sim_minute": {key: value / sim_minutes for key, value in totals.items()} if sim_minutes else {},
+        }
+    return {
+        "config": config_file,
+        "seed": seed,
+        "sim_minutes": sim_minutes,
+        "wall_seconds": wall_seconds,
+        "categories": categories,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Zwraca listę metryk, które wzrosły względem raportu bazowego o więcej niż tolerance."""
+    regressions = []
+    for category, data in report["categories"].items():
+        base = baseline.get("categories", {}).get(category)
+        if not base:
+            continue
+        # Import mapy jest jednorazowy - porównujemy sumy, pozostałe kategorie na minutę symulacji
+        scope = "total" if category == "map_import" else "per_sim_minute"
+        for metric in METRICS:
+            old, new = base[scope].get(metric, 0), data[scope].get(metric, 0)
+            if new > old * (1 + tolerance) and new - old > 1e-9:
+                regressions.append(f"{category}.{metric}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pomiar ruchu do bazy symulacji GOPR (bez serwera bazy).")
+    parser.add_argument("--config", default="config.json", help="plik konfiguracji scenariusza")
+    parser.add_argument("--seed", type=int, default=0, help="ziarno generatora liczb losowych")
+    parser.add_argument("--report", default="bench_db_report.json", help="plik raportu JSON")
+    parser.add_argument("--baseline", metavar="PLIK", help="raport bazowy do porównania")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="dopuszczalny względny wzrost metryk względem raportu bazowego")
+    parser.add_argument("--single-writer", action="store_true",
+                        help="jeden tor zapisu zamiast trzech (lokalizacje zwierząt i turystów liczone razem)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args.config, seed=args.seed, parallel_writers=not args.single_writer)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"[BENCH DB] minut symulacji: {report['sim_minutes']:.0f}, czas: {report['wall_seconds']:.2f} s")
+    print(f"{'kategoria':<14}{'round-trips':>14}{'instrukcje':>14}{'wiersze':>14}{'bajty':>14}")
+    for category, data in report["categories"].items():
+        # Import mapy jest jednorazowy - pokazujemy sumę, resztę na minutę symulacji
+        scope = "total" if category == "map_import" else "per_sim_minute"
+        print(f"{category:<14}" + "".join(f"{data[scope][m]:>14.2f}" for m in METRICS)
+              + ("   (łącznie)" if scope == "total" else "   (na minutę)"))
+    print(f"[BENCH DB] raport zapisany do {args.report}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESJA] {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
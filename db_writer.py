@@ -0,0 +1,380 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Tabele obsługiwane przez zapis w tle, w kolejności zależności kluczy obcych:
+# najpierw lokalizacje, stacje pogodowe i turyści, potem rekordy, które się do nich odwołują.
+TABLE_ORDER = ["location", "weather_station", "weather_station_map", "tourist", "simulated_tourist",
+               "weather_reading", "animal_location", "tourist_location"]
+
+# Tabele o dużym wolumenie wczytywane przez COPY zamiast INSERT: tabela -> (pełna nazwa, kolumny)
+COPY_TABLES = {
+    "location": ("simulation_gopr.location", ("location_id", "longitude", "latitude")),
+    "weather_reading": ("simulation_gopr.weather_reading",
+                        ("reading_id", "timestamp", "wind", "fog", "temperature", "rain", "station_id",
+                         "simulation_id")),
+    "animal_location": ("simulation_gopr.animal_location",
+                        ("location_id", "animal_id", "simulation_id", "simulated_timestamp")),
+    "tourist_location": ("simulation_gopr.tourist_location",
+                         ("phone_id", "location_id", "simulated_timestamp", "simulation_id")),
+}
+
+# Instrukcje przygotowane (dla małych paczek i tabel bez COPY): tabela -> (nazwa instrukcji, zapytanie z $1..$n)
+PREPARED_INSERTS = {
+    "location": ("insert_location", """
+        INSERT INTO simulation_gopr.location (location_id, longitude, latitude)
+        VALUES ($1, $2, $3)
+    """),
+    "weather_station": ("insert_weather_station", """
+        INSERT INTO simulation_gopr.weather_station (weather_station_id, location_id)
+        VALUES ($1, $2)
+        ON CONFLICT (weather_station_id) DO NOTHING
+    """),
+    "weather_station_map": ("insert_weather_station_map", """
+        INSERT INTO simulation_gopr.weather_station_map (station_id, map_name, station_number)
+        VALUES ($1, $2, $3)
+        ON CONFLICT DO NOTHING
+    """),
+    "tourist": ("insert_tourist", """
+        INSERT INTO simulation_gopr.tourist (phone_id, location_type)
+        VALUES ($1, $2)
+        ON CONFLICT (phone_id) DO NOTHING
+    """),
+    "simulated_tourist": ("insert_simulated_tourist", """
+        INSERT INTO simulation_gopr.simulated_tourist (phone_id, simulation_id)
+        VALUES ($1, $2)
+    """),
+    "weather_reading": ("insert_weather_reading", """
+        INSERT INTO simulation_gopr.weather_reading
+            (reading_id, timestamp, wind, fog, temperature, rain, station_id, simulation_id)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    """),
+    "animal_location": ("insert_animal_location", """
+        INSERT INTO simulation_gopr.animal_location (location_id, animal_id, simulation_id, simulated_timestamp)
+        VALUES ($1, $2, $3, $4)
+    """),
+    "tourist_location": ("insert_tourist_location", """
+        INSERT INTO simulation_gopr.tourist_location (phone_id, location_id, simulated_timestamp, simulation_id)
+        VALUES ($1, $2, $3, $4)
+    """),
+}
+# Od tej liczby wierszy COPY jest tańsze niż wykonania instrukcji przygotowanej
+COPY_MIN_ROWS = 500
+# Odstępy (sekundy) między kolejnymi próbami zapisu paczki, zanim zostanie rozbita na pojedyncze kroki
+RETRY_DELAYS = (0.5, 1.0, 2.0)
+
+
+def write_rows(db, table, rows, copy_min_rows=COPY_MIN_ROWS):
+    """
+    Zapisuje wiersze tabeli najtańszą dostępną metodą: duże paczki przez COPY,
+    małe przez instrukcję przygotowaną.
+    """
+    if table in COPY_TABLES and len(rows) >= copy_min_rows:
+        full_name, columns = COPY_TABLES[table]
+        return db.copy_rows(full_name, columns, rows)
+    name, query = PREPARED_INSERTS[table]
+    return db.execute_prepared(name, query, rows)
+
+
+class DBWriter:
+    """
+    Zapis do bazy w osobnym wątku, zasilanym przez ograniczoną kolejkę.
+
+    Symulacja tylko dokłada do kolejki wiersze kroku - wszystkie tabele razem, bo odwołują
+    się do siebie nawzajem (submit) - a wątek zapisujący łączy wiele kroków w duże paczki
+    i zapisuje je, gdy uzbiera się flush_rows wierszy albo najstarszy krok czeka dłużej niż
+    flush_seconds. Gdy kolejka jest pełna, decyduje polityka:
+        - "block": submit czeka, aż wątek zapisujący zrobi miejsce,
+        - "drop_oldest": najstarsze kroki w kolejce są porzucane w całości (poza rejestracjami
+          dodanymi z droppable=False, do których odwołują się późniejsze kroki),
+        - "spill": nadmiarowe kroki trafiają do pliku spill_path i są zapisywane później.
+    Nieudany zapis paczki jest ponawiany co RETRY_DELAYS; jeśli wciąż się nie udaje, kroki są
+    zapisywane pojedynczo, a te, których nie da się zapisać, trafiają do pliku failed_path
+    (<spill_path>_failed) i są liczone jako porzucone.
+    """
+    POLICIES = ("block", "drop_oldest", "spill")
+
+    def __init__(self, db, max_queue_rows=200000, flush_rows=5000, flush_seconds=2.0,
+                 policy="block", spill_path="db_spill.ndjson", copy_min_rows=COPY_MIN_ROWS):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Nieznana polityka kolejki zapisu: {policy}. Dozwolone: {self.POLICIES}")
+        self.db = db
+        self.max_queue_rows = max_queue_rows
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.policy = policy
+        self.spill_path = spill_path
+        root, ext = os.path.splitext(spill_path)
+        self.failed_path = f"{root}_failed{ext}"
+        self.copy_min_rows = copy_min_rows
+
+        self.queue = deque()  # (słownik tabela -> wiersze, liczba wierszy, czas dodania, czy można porzucić)
+        self.queue_rows = 0
+        self.spilled_pending = 0  # wiersze w pliku spill, jeszcze niezapisane do bazy
+        self.spill_offset = 0  # pozycja w pliku spill, do której wiersze są już zapisane do bazy
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        self.max_queue_depth = 0
+        self.written_rows = 0
+        self.flushes = 0
+        self.dropped_rows = 0
+        self.spilled_rows = 0
+        self.blocked_seconds = 0.0
+        self.errors = 0
+
+    def start(self):
+        if self.thread is None:
+            if os.path.exists(self.spill_path):
+                # Pozostałość po przerwanym przebiegu (z innym simulation_id) - nie mieszamy jej z bieżącym
+                print(f"[ZAPIS DB] Usunięto zaległy plik {self.spill_path} z poprzedniego przebiegu.")
+                os.remove(self.spill_path)
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self.thread.start()
+
+    def submit(self, batch, droppable=True):
+        """
+        Dodaje do kolejki zapisu wiersze jednego kroku.
+
+        Args:
+            batch (dict): Nazwa tabeli z TABLE_ORDER -> lista wierszy w kolejności kolumn
+                zapytania dla tej tabeli. Tabele jednego kroku są porzucane lub odkładane
+                na dysk razem, więc wiersze odwołujące się do siebie nie są rozdzielane.
+            droppable (bool): False dla rejestracji (np. nowych turystów), do których odwołują się
+                wiersze kolejnych kroków - polityka "drop_oldest" ich nie porzuca.
+        """
+        unknown = set(batch) - set(PREPARED_INSERTS)
+        if unknown:
+            raise ValueError(f"Nieobsługiwana tabela: {', '.join(sorted(unknown))}")
+        batch = {table: list(rows) for table, rows in batch.items() if rows}
+        count = sum(len(rows) for rows in batch.values())
+        if not count:
+            return
+        with self.condition:
+            # Póki w pliku są zaległe wiersze, nowe też idą do pliku, żeby zachować kolejność zapisu
+            if self.spilled_pending:
+                self._spill(batch, count)
+                return
+
+            if self.queue_rows + count > self.max_queue_rows and self.queue:
+                if self.policy == "block":
+                    wait_start = time.perf_counter()
+                    while self.running and self.queue and self.queue_rows + count > self.max_queue_rows:
+                        self.condition.notify_all()
+                        self.condition.wait(0.1)
+                    self.blocked_seconds += time.perf_counter() - wait_start
+                elif self.policy == "drop_oldest":
+                    self._drop_oldest(count)
+                else:
+                    self._spill(batch, count)
+                    return
+
+            self.queue.append((batch, count, time.monotonic(), droppable))
+            self.queue_rows += count
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_rows)
+            if self.queue_rows >= self.flush_rows:
+                self.condition.notify_all()
+
+    def _drop_oldest(self, count):
+        """Porzuca najstarsze kroki, aż zmieści się count wierszy; rejestracje są pomijane i zostają w kolejce."""
+        kept = deque()
+        while self.queue and self.queue_rows + count > self.max_queue_rows:
+            entry = self.queue.popleft()
+            _, batch_rows, _, droppable = entry
+            if droppable:
+                self.queue_rows -= batch_rows
+                self.dropped_rows += batch_rows
+            else:
+                kept.append(entry)
+        kept.extend(self.queue)
+        self.queue = kept
+
+    def _spill(self, batch, count):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(batch, default=str) + "\n")
+        self.spilled_pending += count
+        self.spilled_rows += count
+
+    def _load_spill(self):
+        """
+        Wczytuje z pliku spill kolejną porcję zaległych kroków (około flush_rows wierszy).
+
+        Returns:
+            tuple: (lista kroków, (pozycja końca porcji w pliku, liczba wierszy porcji)) - drugi element
+                trzeba przekazać do _advance_spill po zapisaniu porcji.
+        """
+        batches = []
+        count = 0
+        with open(self.spill_path, "rb") as f:
+            f.seek(self.spill_offset)
+            while count < self.flush_rows:
+                line = f.readline()
+                if not line:
+                    break
+                batch = json.loads(line)
+                batches.append({table: [tuple(row) for row in rows] for table, rows in batch.items()})
+                count += sum(len(rows) for rows in batch.values())
+            end = f.tell()
+        return batches, (end, count)
+
+    def _advance_spill(self, end, count):
+        """Przesuwa pozycję w pliku spill za zapisaną porcję; plik bez zaległości jest usuwany."""
+        self.spill_offset = end
+        self.spilled_pending -= count
+        if self.spilled_pending <= 0:
+            self.spilled_pending = 0
+            self.spill_offset = 0
+            os.remove(self.spill_path)
+
+    def _flush_due(self):
+        if not self.queue:
+            return bool(self.spilled_pending)
+        if self.queue_rows >= self.flush_rows:
+            return True
+        return time.monotonic() - self.queue[0][2] >= self.flush_seconds
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self._flush_due():
+                    timeout = self.flush_seconds
+                    if self.queue:
+                        timeout = max(0.0, self.flush_seconds - (time.monotonic() - self.queue[0][2]))
+                    self.condition.wait(timeout)
+                if not self.running and not self.queue and not self.spilled_pending:
+                    return
+                batches = [entry[0] for entry in self.queue]
+                self.queue.clear()
+                self.queue_rows = 0
+                spill_chunk = None
+                if not batches and self.spilled_pending:
+                    # Kolejka w pamięci pusta - czas dopisać porcję tego, co trafiło na dysk
+                    batches, spill_chunk = self._load_spill()
+                self.condition.notify_all()
+            self._write(batches)
+            if spill_chunk:
+                with self.condition:
+                    self._advance_spill(*spill_chunk)
+
+    def _write_merged(self, batches):
+        """Zapisuje kroki jako jedną transakcję (wszystkie tabele razem); zwraca False, jeśli się nie udało."""
+        merged = {table: [] for table in TABLE_ORDER}
+        for batch in batches:
+            for table, rows in batch.items():
+                merged[table].extend(rows)
+        table = None
+        try:
+            with self.db.unit_of_work():
+                for table in TABLE_ORDER:
+                    rows = merged[table]
+                    if not rows:
+                        continue
+                    write_rows(self.db, table, rows, self.copy_min_rows)
+        except Exception as e:
+            self.errors += 1
+            print(f"[BŁĄD ZAPISU] {table}: {e}")
+            return False
+        self.written_rows += sum(len(rows) for rows in merged.values())
+        return True
+
+    def _write(self, batches):
+        if not batches:
+            return
+        self.flushes += 1
+        if self._write_merged(batches):
+            return
+        for delay in RETRY_DELAYS:
+            time.sleep(delay)
+            if self._write_merged(batches):
+                return
+        # Paczka wciąż się nie zapisuje - kroki osobno, żeby jeden błędny nie pociągnął za sobą reszty
+        for batch in batches:
+            if not self._write_merged([batch]):
+                self._dead_letter(batch)
+
+    def _dead_letter(self, batch):
+        """Odkłada krok, którego nie udało się zapisać, do pliku failed_path i liczy go jako porzucony."""
+        count = sum(len(rows) for rows in batch.values())
+        with open(self.failed_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(batch, default=str) + "\n")
+        with self.condition:
+            self.dropped_rows += count
+        print(f"[BŁĄD ZAPISU] Krok ({count} wierszy) odłożony do {self.failed_path}.")
+
+    def close(self):
+        """Zapisuje wszystko, co zostało w kolejce i w pliku spill, i kończy wątek."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def get_stats(self):
+        """Zwraca statystyki kolejki zapisu."""
+        with self.condition:
+            return {
+                "queue_depth": self.queue_rows,
+                "max_queue_depth": self.max_queue_depth,
+                "spilled_pending": self.spilled_pending,
+                "written_rows": self.written_rows,
+                "flushes": self.flushes,
+                "dropped_rows": self.dropped_rows,
+                "spilled_rows": self.spilled_rows,
+                "blocked_seconds": self.blocked_seconds,
+                "errors": self.errors,
+            }
+
+
+class WriterLanes:
+    """
+    Kilka niezależnych wątków zapisu (torów), każdy z własnym połączeniem z bazą.
+
+    Tor grupuje tabele, które muszą być zapisywane w ustalonej kolejności (np. lokalizacje
+    turystów przed tourist_location), a różne tory zapisują równolegle. Wiersze trafiają do
+    toru wskazanego przy submit(); tory spoza lanes trafiają do toru domyślnego (pierwszego).
+    """
+
+    def __init__(self, connect, lanes=("main",), **writer_kwargs):
+        """
+        Args:
+            connect (callable): Zwraca nowy, połączony DBConnector dla toru.
+            lanes (list of str): Nazwy torów.
+            **writer_kwargs: Parametry przekazywane do każdego DBWriter.
+        """
+        spill_path = writer_kwargs.pop("spill_path", "db_spill.ndjson")
+        root, ext = os.path.splitext(spill_path)
+        self.writers = {}
+        for lane in lanes:
+            lane_spill = spill_path if len(lanes) == 1 else f"{root}_{lane}{ext}"
+            self.writers[lane] = DBWriter(connect(), spill_path=lane_spill, **writer_kwargs)
+        self.default_lane = lanes[0]
+
+    def start(self):
+        for writer in self.writers.values():
+            writer.start()
+
+    def submit(self, batch, lane=None, droppable=True):
+        """Dodaje wiersze kroku do kolejki zapisu toru lane (patrz DBWriter.submit)."""
+        self.writers.get(lane, self.writers[self.default_lane]).submit(batch, droppable)
+
+    def close(self):
+        """Zapisuje zaległe wiersze wszystkich torów, kończy ich wątki i zwalnia połączenia."""
+        for writer in self.writers.values():
+            writer.close()
+            writer.db.disconnect()
+
+    def get_stats(self):
+        """Zwraca statystyki zsumowane po wszystkich torach."""
+        total = {}
+        for writer in self.writers.values():
+            for key, value in writer.get_stats().items():
+                if key.startswith("max_"):
+                    total[key] = max(total.get(key, 0), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+        return total
@@ -0,0 +1,137 @@
+import bisect
+import json
+import os
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+def _paths(file_path):
+    """Zwraca (wzorzec nazw segmentów, ścieżkę indeksu) dla pliku historii, np. history.ndjson."""
+    root, ext = os.path.splitext(file_path)
+    return root + ".{:03d}" + (ext or ".ndjson"), root + ".index.tsv"
+
+
+def _to_key(sim_time):
+    if isinstance(sim_time, datetime):
+        return sim_time.strftime(TIMESTAMP_FORMAT)
+    return sim_time
+
+
+class HistoryWriter:
+    """
+    Dopisywany log historii przebiegu: jeden wiersz NDJSON na krok, dzielony na segmenty.
+
+    Gdy segment przekroczy max_segment_bytes, kolejne kroki trafiają do następnego
+    (history.000.ndjson, history.001.ndjson, ...). Obok powstaje indeks history.index.tsv
+    z wierszami "czas symulacji, numer segmentu, przesunięcie w bajtach", dzięki któremu
+    HistoryReader czyta od dowolnej minuty bez parsowania wcześniejszej części pliku.
+    Indeks wymaga rosnących czasów, więc istniejąca historia o tej samej nazwie jest usuwana.
+    """
+
+    def __init__(self, file_path="simulation_history.ndjson", max_segment_bytes=DEFAULT_MAX_SEGMENT_BYTES):
+        self.segment_pattern, self.index_path = _paths(file_path)
+        self.max_segment_bytes = max_segment_bytes
+
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        old_segment = 0
+        while os.path.exists(self.segment_pattern.format(old_segment)):
+            os.remove(self.segment_pattern.format(old_segment))
+            old_segment += 1
+
+        self.segment = 0
+        self.file = None
+        self._open_segment()
+        self.index = open(self.index_path, "w", encoding="utf-8")
+
+    def _open_segment(self):
+        if self.file:
+            self.file.close()
+        self.file = open(self.segment_pattern.format(self.segment), "ab")
+        self.offset = self.file.tell()
+
+    def append(self, sim_time, record):
+        """Dopisuje rekord kroku sim_time (datetime lub tekst w formacie TIMESTAMP_FORMAT)."""
+        if self.offset >= self.max_segment_bytes:
+            self.segment += 1
+            self._open_segment()
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        self.file.write(line)
+        self.index.write(f"{_to_key(sim_time)}\t{self.segment}\t{self.offset}\n")
+        self.offset += len(line)
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+class HistoryReader:
+    """
+    Odczyt historii zapisanej przez HistoryWriter.
+
+    Indeks jest wczytywany w całości (kilka tysięcy krótkich wierszy dla 10 godzin
+    symulacji), a rekordy są czytane dopiero od wskazanego miejsca.
+    """
+
+    def __init__(self, file_path="simulation_history.ndjson"):
+        self.segment_pattern, self.index_path = _paths(file_path)
+        self.times = []
+        self.positions = []  # (segment, przesunięcie) dla kolejnych wpisów self.times
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                sim_time, segment, offset = line.rstrip("\n").split("\t")
+                self.times.append(sim_time)
+                self.positions.append((int(segment), int(offset)))
+
+    def __len__(self):
+        return len(self.times)
+
+    def _read_at(self, position, files):
+        segment, offset = self.positions[position]
+        if segment not in files:
+            files[segment] = open(self.segment_pattern.format(segment), "rb")
+        f = files[segment]
+        f.seek(offset)
+        return json.loads(f.readline())
+
+    def find(self, sim_time):
+        """Indeks ostatniego kroku nie późniejszego niż sim_time (-1, jeśli historia zaczyna się później)."""
+        return bisect.bisect_right(self.times, _to_key(sim_time)) - 1
+
+    def read(self, sim_time):
+        """Zwraca rekord kroku obowiązującego w chwili sim_time lub None."""
+        position = self.find(sim_time)
+        if position < 0:
+            return None
+        files = {}
+        try:
+            return self._read_at(position, files)
+        finally:
+            for f in files.values():
+                f.close()
+
+    def iter_range(self, start=None, end=None):
+        """
+        Zwraca kolejno (czas symulacji, rekord) dla kroków z przedziału [start, end].
+
+        Args:
+            start (datetime lub str, opcjonalnie): Początek przedziału (domyślnie początek historii).
+            end (datetime lub str, opcjonalnie): Koniec przedziału (domyślnie koniec historii).
+        """
+        first = 0 if start is None else bisect.bisect_left(self.times, _to_key(start))
+        last = len(self.times) if end is None else bisect.bisect_right(self.times, _to_key(end))
+        files = {}
+        try:
+            for position in range(first, last):
+                yield self.times[position], self._read_at(position, files)
+        finally:
+            for f in files.values():
+                f.close()
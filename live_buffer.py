@@ -0,0 +1,204 @@
+import json
+import mmap
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from trajectory_export import EPOCH, to_epoch_us
+
+MAGIC = b"GOPRLIVE"
+VERSION = 2
+# Nagłówek pliku: actors to liczba wpisów słownika aktorów zapisanych już w pliku obok,
+# latest to numer ostatniego w pełni zapisanego kroku (0 - jeszcze żadnego)
+HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("slots", "<u4"),
+                   ("capacity", "<u4"), ("actors", "<u4"), ("latest", "<u8")])
+# Nagłówek slotu: seq jest nieparzysty w trakcie zapisu (seqlock)
+SLOT_HEADER = np.dtype([("seq", "<u8"), ("tick", "<u8"), ("time_us", "<i8"),
+                        ("count", "<u4"), ("dropped", "<u4")])
+ACTOR_KINDS = ("tourist", "animal")
+
+
+def _layout(slots, capacity):
+    """Zwraca (rozmiar slotu, rozmiar pliku) dla danej liczby slotów i pojemności slotu."""
+    slot_size = SLOT_HEADER.itemsize + capacity * 4 + capacity * 2 * 8
+    return slot_size, HEADER.itemsize + slots * slot_size
+
+
+def _views(buffer, slots, capacity):
+    """Widoki NumPy na nagłówek, nagłówki slotów, kody aktorów i pozycje (bez kopiowania)."""
+    slot_size, _ = _layout(slots, capacity)
+    header = np.ndarray((), dtype=HEADER, buffer=buffer)
+    slot_headers, actors, positions = [], [], []
+    for slot in range(slots):
+        offset = HEADER.itemsize + slot * slot_size
+        slot_headers.append(np.ndarray((), dtype=SLOT_HEADER, buffer=buffer, offset=offset))
+        offset += SLOT_HEADER.itemsize
+        actors.append(np.ndarray(capacity, dtype="<i4", buffer=buffer, offset=offset))
+        offset += capacity * 4
+        positions.append(np.ndarray((capacity, 2), dtype="<f8", buffer=buffer, offset=offset))
+    return header, slot_headers, actors, positions
+
+
+def _actors_path(path):
+    return path + ".actors.ndjson"
+
+
+class LiveBufferWriter:
+    """
+    Bufor pozycji aktorów w pamięci współdzielonej (plik mapowany przez mmap) dla czytelników na żywo.
+
+    Plik ma stały układ: nagłówek i pierścień slotów; każdy slot zawiera numer kroku, czas
+    symulacji, liczbę aktorów, ich kody (int32) i pozycje (float64 długość, szerokość).
+    Zapis kroku chroni seqlock - licznik seq slotu jest nieparzysty w trakcie zapisu -
+    więc czytelnik (LiveBufferReader) nigdy nie dostaje stanu w połowie zapisanego.
+    Słownik kodów aktorów (rodzaj, identyfikator) jest w pliku obok (<plik>.actors.ndjson), po jednym
+    wpisie w linii; nowy aktor tylko dopisuje linię, a pole actors nagłówka mówi, ile linii jest kompletnych.
+    """
+
+    def __init__(self, path="live_positions.bin", slots=4, capacity=4096):
+        """
+        Args:
+            path (str): Ścieżka pliku bufora (tworzony lub nadpisywany).
+            slots (int): Liczba slotów pierścienia.
+            capacity (int): Maksymalna liczba aktorów w jednym kroku; nadmiarowi są pomijani (pole dropped).
+        """
+        self.path = path
+        self.slots = max(int(slots), 2)
+        self.capacity = int(capacity)
+        _, size = _layout(self.slots, self.capacity)
+
+        # Oba pliki powstają pod tymczasowymi nazwami i podmieniają stare przez os.replace - czytelnik,
+        # który ma jeszcze zmapowany poprzedni bufor, zostaje przy starych plikach zamiast dostać SIGBUS
+        actors_tmp_path = _actors_path(path) + ".tmp"
+        self.actors_file = open(actors_tmp_path, "wb")
+        os.replace(actors_tmp_path, _actors_path(path))
+
+        tmp_path = path + ".tmp"
+        self.file = open(tmp_path, "w+b")
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+        self.header, self.slot_headers, self.actors, self.positions = _views(self.mm, self.slots, self.capacity)
+        self.header["magic"] = MAGIC
+        self.header["version"] = VERSION
+        self.header["slots"] = self.slots
+        self.header["capacity"] = self.capacity
+        os.replace(tmp_path, path)
+
+        self.tick = 0
+        self.actor_index = {}
+
+    def _encode_actors(self, actors):
+        codes = np.empty(len(actors), dtype=np.int32)
+        new_actors = []
+        for i, actor in enumerate(actors):
+            code = self.actor_index.get(actor)
+            if code is None:
+                code = self.actor_index[actor] = len(self.actor_index)
+                new_actors.append(actor)
+            codes[i] = code
+        if new_actors:
+            # Nowe wpisy muszą być w pliku, zanim czytelnik zobaczy je w nagłówku i nowe kody w slotach
+            self.actors_file.write(b"".join(json.dumps(actor).encode("utf-8") + b"\n" for actor in new_actors))
+            self.actors_file.flush()
+            self.header["actors"] = len(self.actor_index)
+        return codes
+
+    def publish(self, sim_time, animals, tourists):
+        """Publikuje pozycje zwierząt i turystów z jednego kroku (formaty z TickRecords)."""
+        actors = ([(1, loc["animal_id"]) for loc in animals]
+                  + [(0, loc["PhoneId"]) for loc in tourists])[:self.capacity]
+        count = len(actors)
+        codes = self._encode_actors(actors)
+        coordinates = ([(loc["longitude"], loc["latitude"]) for loc in animals]
+                       + [(loc["location"]["longitude"], loc["location"]["latitude"]) for loc in tourists])
+
+        self.tick += 1
+        slot = (self.tick - 1) % self.slots
+        slot_header = self.slot_headers[slot]
+        seq = int(slot_header["seq"])
+        slot_header["seq"] = seq + 1
+        slot_header["tick"] = self.tick
+        slot_header["time_us"] = to_epoch_us(sim_time)
+        slot_header["count"] = count
+        slot_header["dropped"] = len(animals) + len(tourists) - count
+        self.actors[slot][:count] = codes
+        if count:
+            self.positions[slot][:count] = np.array(coordinates[:count], dtype=np.float64)
+        slot_header["seq"] = seq + 2
+        self.header["latest"] = self.tick
+
+    def close(self):
+        self.header, self.slot_headers, self.actors, self.positions = None, None, None, None
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+        self.actors_file.close()
+
+
+class LiveBufferReader:
+    """Czytelnik bufora LiveBufferWriter - zwraca spójny stan ostatniego kroku bez parsowania JSON."""
+
+    def __init__(self, path="live_positions.bin"):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.ndarray((), dtype=HEADER, buffer=self.mm)
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError(f"{path} nie jest buforem pozycji w wersji {VERSION}")
+        self.slots = int(header["slots"])
+        self.capacity = int(header["capacity"])
+        self.header, self.slot_headers, self.actors, self.positions = _views(self.mm, self.slots, self.capacity)
+        self.actors_file = open(_actors_path(path), "rb")
+        self.actor_ids = []
+
+    def _actor(self, code):
+        if code >= len(self.actor_ids):
+            # Doczytuje tylko nowe, kompletne wpisy słownika (ich liczbę podaje nagłówek)
+            for _ in range(int(self.header["actors"]) - len(self.actor_ids)):
+                self.actor_ids.append(json.loads(self.actors_file.readline()))
+        return self.actor_ids[code]
+
+    def read(self, retries=100):
+        """
+        Zwraca stan ostatniego kroku lub None, jeśli nic jeszcze nie opublikowano.
+
+        Returns:
+            dict: tick, sim_time (datetime), dropped, actor_codes (int32), positions (float64 [n, 2]).
+                Kody aktorów tłumaczy actor(); tablice są kopiami, więc pozostają spójne po powrocie.
+        """
+        for _ in range(retries):
+            latest = int(self.header["latest"])
+            if latest == 0:
+                return None
+            slot = (latest - 1) % self.slots
+            slot_header = self.slot_headers[slot]
+            seq = int(slot_header["seq"])
+            if seq & 1:
+                continue
+            tick = int(slot_header["tick"])
+            time_us = int(slot_header["time_us"])
+            count = min(int(slot_header["count"]), self.capacity)
+            dropped = int(slot_header["dropped"])
+            actor_codes = self.actors[slot][:count].copy()
+            positions = self.positions[slot][:count].copy()
+            if int(slot_header["seq"]) == seq and tick == latest:
+                return {
+                    "tick": tick,
+                    "sim_time": EPOCH + timedelta(microseconds=time_us),
+                    "dropped": dropped,
+                    "actor_codes": actor_codes,
+                    "positions": positions,
+                }
+        raise TimeoutError(f"Nie udało się odczytać spójnego stanu z {self.path}")
+
+    def actor(self, code):
+        """Zwraca (rodzaj aktora z ACTOR_KINDS, identyfikator) dla kodu z read()."""
+        kind, actor_id = self._actor(int(code))
+        return ACTOR_KINDS[kind], actor_id
+
+    def close(self):
+        self.header, self.slot_headers, self.actors, self.positions = None, None, None, None
+        self.mm.close()
+        self.file.close()
+        self.actors_file.close()
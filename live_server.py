@@ -0,0 +1,210 @@
+import asyncio
+import mimetypes
+import os
+import queue
+import threading
+from urllib.parse import unquote, urlsplit
+
+# Jedyne pliki, które serwer udostępnia z katalogu projektu (mapa, tło, dane statyczne, migawki JSON);
+# reszta katalogu - w tym config.json z hasłem do bazy - pozostaje niedostępna
+STATIC_FILES = (
+    "map.html",
+    "Krakow.png",
+    "map_sample.json",
+    "animal_routes.json",
+    "weather_station.json",
+    "animal_locations.json",
+    "tourist_location.json",
+)
+HEARTBEAT_SECONDS = 15
+
+
+class LiveServer:
+    """
+    Serwer HTTP (asyncio) podglądu na żywo, działający w wątku procesu symulacji.
+
+    Stan kolejnych kroków bierze prosto z pamięci - z subskrypcji DisplaySink - i udostępnia:
+        /events  - strumień Server-Sent Events, nowy stan wypychany do przeglądarki (EventSource),
+        /state   - ostatni stan jako JSON dla klientów odpytujących (z ETag, więc bez zmian zwraca 304),
+        /...     - pliki z STATIC_FILES z katalogu projektu (domyślnie map.html).
+    Stan jest rozsyłany nie częściej niż co min_interval sekund; wolny klient dostaje
+    zawsze najnowszy stan, a pośrednie są pomijane.
+    """
+
+    def __init__(self, display, host="127.0.0.1", port=8000, root=".", min_interval=0.2):
+        """
+        Args:
+            display (sinks.DisplaySink): Ujście, z którego serwer subskrybuje stan kroków.
+            host (str): Adres nasłuchu.
+            port (int): Port nasłuchu.
+            root (str): Katalog plików statycznych.
+            min_interval (float): Minimalny odstęp między kolejnymi rozsyłanymi stanami (sekundy).
+        """
+        self.display = display
+        self.host = host
+        self.port = port
+        self.root = os.path.abspath(root)
+        self.min_interval = min_interval
+        self.latest = None
+        self.version = 0  # numer rozesłanego stanu (ETag i id zdarzeń SSE)
+        self.loop = None
+        self.changed = None
+        self.stopping = None
+        self.thread = None
+        self.ready = threading.Event()  # ustawiane, gdy serwer nasłuchuje albo nie udało się go uruchomić
+        self.error = None  # wyjątek, z którym zakończył się serwer (np. zajęty port)
+
+    def start(self):
+        """
+        Uruchamia serwer w osobnym wątku i czeka, aż zacznie nasłuchiwać.
+
+        Returns:
+            bool: True, jeśli serwer nasłuchuje; False, jeśli nie udało się go uruchomić.
+        """
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error or not self.ready.is_set():
+            print(f"[PODGLĄD] Nie udało się uruchomić serwera na {self.host}:{self.port}: "
+                  f"{self.error or 'brak odpowiedzi'}")
+            return False
+        print(f"[PODGLĄD] Mapa na żywo: http://{self.host}:{self.port}/")
+        return True
+
+    def _run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def stop(self):
+        """Zatrzymuje serwer i zamyka połączenia klientów."""
+        if self.loop and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+            self.thread.join(5)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Condition()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        pump = asyncio.create_task(self.pump())
+        self.ready.set()
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            pump.cancel()
+            async with self.changed:
+                self.changed.notify_all()
+
+    def _next_state(self, subscription):
+        try:
+            return subscription.get(timeout=0.5)
+        except queue.Empty:
+            return None
+
+    async def pump(self):
+        """Przenosi stany z subskrypcji DisplaySink (kolejka wątkowa) do klientów asyncio."""
+        subscription = self.display.subscribe()
+        try:
+            while True:
+                payload = await self.loop.run_in_executor(None, self._next_state, subscription)
+                if payload is None:
+                    continue
+                async with self.changed:
+                    self.latest = payload
+                    self.version += 1
+                    self.changed.notify_all()
+                await asyncio.sleep(self.min_interval)
+        finally:
+            self.display.unsubscribe(subscription)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], unquote(urlsplit(request_line[1]).path)
+
+            if method not in ("GET", "HEAD"):
+                await self.respond(writer, 405, b"Method Not Allowed")
+            elif path == "/events":
+                await self.stream_events(writer)
+            elif path == "/state":
+                await self.send_state(writer, headers, method == "HEAD")
+            else:
+                await self.send_file(writer, path, method == "HEAD")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, body=b"", content_type="text/plain; charset=utf-8",
+                      extra_headers=(), head=False):
+        reasons = {200: "OK", 204: "No Content", 304: "Not Modified", 404: "Not Found", 405: "Method Not Allowed"}
+        lines = [f"HTTP/1.1 {status} {reasons[status]}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}",
+                 "Cache-Control: no-cache",
+                 "Connection: close",
+                 *extra_headers]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if not head:
+            writer.write(body)
+        await writer.drain()
+
+    async def send_state(self, writer, headers, head=False):
+        """Ostatni stan dla klientów odpytujących; 204, dopóki symulacja nic nie wysłała."""
+        version, payload = self.version, self.latest
+        if payload is None:
+            await self.respond(writer, 204, head=head)
+        elif headers.get("if-none-match") == f'"{version}"':
+            await self.respond(writer, 304, extra_headers=[f'ETag: "{version}"'], head=head)
+        else:
+            await self.respond(writer, 200, payload.encode("utf-8"), "application/json",
+                               [f'ETag: "{version}"'], head)
+
+    async def stream_events(self, writer):
+        """Strumień SSE: bieżący stan od razu, potem każdy kolejny; co HEARTBEAT_SECONDS komentarz podtrzymujący."""
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Connection: keep-alive\r\n\r\n")
+        await writer.drain()
+        sent = 0
+        while not self.stopping.is_set():
+            try:
+                async with self.changed:
+                    await asyncio.wait_for(
+                        self.changed.wait_for(lambda: self.version != sent or self.stopping.is_set()),
+                        HEARTBEAT_SECONDS
+                    )
+                    sent, payload = self.version, self.latest
+            except asyncio.TimeoutError:
+                writer.write(b": ping\n\n")
+            else:
+                if self.stopping.is_set():
+                    break
+                writer.write(f"id: {sent}\ndata: {payload}\n\n".encode("utf-8"))
+            await writer.drain()
+
+    async def send_file(self, writer, path, head=False):
+        file_name = path.lstrip("/") or "map.html"
+        file_path = os.path.join(self.root, file_name)
+        if file_name not in STATIC_FILES or not os.path.isfile(file_path):
+            await self.respond(writer, 404, b"Not Found", head=head)
+            return
+        with open(file_path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        await self.respond(writer, 200, body, content_type, head=head)
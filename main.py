@@ -74,7 +74,7 @@ def main():
         if save_to_db_var.get():
             if not sim.db.connection:
                 sim.db.connect()
-                sim.next_id = simulation_db.get_first_index(sim.db)
+                sim.next_id = simulation_db.allocate_simulation_id(sim.db)
         sim.save_to_db = save_to_db_var.get()
         sim.start()
         update_progress_bar()
@@ -275,6 +275,7 @@ def main():
                 try:
                     p["spawn_chance"] = float(var.get())  # Zmieniamy spawnChance na nową wartość
                     save_paths(paths)  # Zapisujemy ścieżki do pliku
+                    sim.invalidate_route_graph()
                     messagebox.showinfo("Sukces", f"Zmieniono spawnChance dla ścieżki {p['number']}")
                 except ValueError:
                     messagebox.showerror("Błąd", "Nieprawidłowa wartość szansy na spawn")
@@ -0,0 +1,8 @@
+-- Liczniki identyfikatorów rezerwowanych blokami przez simulation_db.IdAllocator:
+-- dla każdej pary (tabela, kolumna) następny niezarezerwowany identyfikator.
+CREATE TABLE IF NOT EXISTS simulation_gopr.id_high_water (
+    table_name  TEXT   NOT NULL,
+    column_name TEXT   NOT NULL,
+    next_id     BIGINT NOT NULL,
+    PRIMARY KEY (table_name, column_name)
+);
@@ -1,4 +1,7 @@
 import json
+import math
+
+JUNCTION_DISTANCE = 10.0  # Maksymalna odległość końców szlaków tworzących skrzyżowanie (w pikselach)
 
 
 def create_map_with_details(map_name, routes, detectors, bts_stations, special_places, raster_map):
@@ -152,3 +155,120 @@ def create_map_sample():
     )
     return result
 
+
+
+class RouteGeometry:
+    """
+    Parametryzacja trasy długością łuku.
+
+    Dla każdego punktu trasy przechowywana jest skumulowana odległość od początku,
+    dzięki czemu położenie turysty można opisać jedną liczbą (odległością wzdłuż
+    trasy), a przesunięcie o dowolny dystans przechodzi płynnie przez kolejne punkty.
+    """
+
+    def __init__(self, route):
+        self.number = route["number"]
+        self.is_entrance = route.get("isEntrance", False)
+        self.points = route["points"]
+        self.xs = [p["longitude"] for p in self.points]
+        self.ys = [p["latitude"] for p in self.points]
+
+        self.cumulative = [0.0]
+        for i in range(1, len(self.points)):
+            self.cumulative.append(
+                self.cumulative[-1] + math.hypot(self.xs[i] - self.xs[i - 1], self.ys[i] - self.ys[i - 1])
+            )
+        self.length = self.cumulative[-1]
+
+    def end_distance(self, point_index):
+        """Odległość wzdłuż trasy dla punktu o danym indeksie (0 lub ostatni)."""
+        return self.cumulative[point_index]
+
+    def segment(self, distance, cursor=0):
+        """
+        Zwraca indeks odcinka [i, i + 1], na którym leży podana odległość.
+
+        Wyszukiwanie startuje od poprzedniego odcinka (kursora), więc przy ruchu
+        krok po kroku ma zamortyzowany koszt O(1).
+        """
+        last = max(len(self.points) - 2, 0)
+        cursor = min(max(cursor, 0), last)
+        while cursor < last and self.cumulative[cursor + 1] < distance:
+            cursor += 1
+        while cursor > 0 and self.cumulative[cursor] > distance:
+            cursor -= 1
+        return cursor
+
+    def point_at(self, distance, cursor=0):
+        """
+        Wyznacza współrzędne punktu leżącego w danej odległości od początku trasy.
+
+        Returns:
+            tuple: (longitude, latitude, indeks odcinka).
+        """
+        i = self.segment(distance, cursor)
+        if len(self.points) < 2:
+            return self.xs[0], self.ys[0], i
+        span = self.cumulative[i + 1] - self.cumulative[i]
+        ratio = (distance - self.cumulative[i]) / span if span > 0 else 0.0
+        ratio = min(max(ratio, 0.0), 1.0)
+        return (self.xs[i] + (self.xs[i + 1] - self.xs[i]) * ratio,
+                self.ys[i] + (self.ys[i + 1] - self.ys[i]) * ratio,
+                i)
+
+
+class RouteGraph:
+    """
+    Graf skrzyżowań szlaków budowany raz dla mapy.
+
+    Dla każdego końca trasy przechowuje listę szlaków, na które można z niego przejść
+    (ich początek lub koniec leży w odległości co najwyżej max_distance), oraz
+    indeks numer trasy -> RouteGeometry, dzięki czemu oba wyszukiwania mają koszt O(1).
+    """
+
+    def __init__(self, routes, max_distance=JUNCTION_DISTANCE):
+        self.max_distance = max_distance
+        self.routes = {route["number"]: RouteGeometry(route) for route in routes}
+        self.order = {route["number"]: i for i, route in enumerate(routes)}
+        self.transitions = {}
+
+        # Końce tras grupowane w siatce o boku max_distance - porównujemy tylko sąsiednie komórki
+        grid = {}
+        for geometry in self.routes.values():
+            for point_index in (0, len(geometry.points) - 1):
+                cell = self._cell(geometry.xs[point_index], geometry.ys[point_index])
+                grid.setdefault(cell, []).append((geometry, point_index))
+
+        for geometry in self.routes.values():
+            for at_end, point_index in ((False, 0), (True, len(geometry.points) - 1)):
+                x, y = geometry.xs[point_index], geometry.ys[point_index]
+                cx, cy = self._cell(x, y)
+                nearby = []
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        for other, other_index in grid.get((cx + dx, cy + dy), []):
+                            if other.number == geometry.number:
+                                continue
+                            if math.hypot(x - other.xs[other_index], y - other.ys[other_index]) <= max_distance:
+                                nearby.append({
+                                    "route_number": other.number,
+                                    "point_index": other_index,
+                                    "direction": 1 if other_index == 0 else -1
+                                })
+                nearby.sort(key=lambda t: (self.order[t["route_number"]], t["point_index"]))
+                self.transitions[(geometry.number, at_end)] = nearby
+
+    def _cell(self, x, y):
+        return math.floor(x / self.max_distance), math.floor(y / self.max_distance)
+
+    def get(self, route_number):
+        """Zwraca RouteGeometry trasy o podanym numerze (lub None)."""
+        return self.routes.get(route_number)
+
+    def get_transitions(self, route_number, at_end):
+        """
+        Zwraca szlaki dostępne z końca (at_end=True) lub początku (at_end=False) trasy.
+
+        Każdy element to słownik z kluczami "route_number", "point_index" i "direction".
+        """
+        return self.transitions.get((route_number, at_end), [])
@@ -0,0 +1,106 @@
+import time
+
+
+class TickScheduler:
+    """
+    Harmonogram kroków symulacji w czasie rzeczywistym.
+
+    Każdy krok ma bezwzględny termin (deadline) liczony od chwili startu, więc czas
+    pracy w kroku (pogoda, zwierzęta, turyści, pliki, baza) nie kumuluje się jako dryf.
+    Gdy krok się spóźni, zachowanie zależy od polityki:
+        - "catch_up": kolejne kroki wykonywane są bez pauzy, aż symulacja dogoni zegar,
+        - "drop": pominięte kroki są porzucane, a następny krok obejmuje ich czas.
+    """
+    POLICIES = ("catch_up", "drop")
+
+    def __init__(self, tick_seconds, time_multiplier, policy="catch_up", max_lag_seconds=5.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Nieznana polityka harmonogramu: {policy}. Dozwolone: {self.POLICIES}")
+        self.tick_seconds = tick_seconds
+        self.time_multiplier = time_multiplier
+        self.policy = policy
+        self.max_lag_seconds = max_lag_seconds
+
+        self.anchor_wall = None
+        self.anchor_tick = 0
+        self.tick = 0
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.total_overrun = 0.0
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+        self.resyncs = 0
+
+    def start(self):
+        """Ustawia punkt odniesienia na bieżącą chwilę."""
+        self.anchor_wall = time.perf_counter()
+        self.anchor_tick = 0
+        self.tick = 0
+
+    def set_time_multiplier(self, time_multiplier):
+        """Zmienia mnożnik czasu, przeliczając punkt odniesienia od bieżącego kroku."""
+        if time_multiplier == self.time_multiplier:
+            return
+        if self.anchor_wall is not None:
+            self._rebase(self._deadline(self.tick))
+        self.time_multiplier = time_multiplier
+
+    def period(self):
+        """Długość jednego kroku w sekundach rzeczywistych."""
+        return self.tick_seconds / self.time_multiplier
+
+    def _deadline(self, tick):
+        return self.anchor_wall + (tick - self.anchor_tick) * self.period()
+
+    def _rebase(self, wall_time):
+        self.anchor_wall = wall_time
+        self.anchor_tick = self.tick
+
+    def wait(self):
+        """
+        Czeka do terminu następnego kroku.
+
+        Returns:
+            int: Liczba kroków porzuconych (tylko dla polityki "drop"), o które
+                 należy dodatkowo przesunąć czas symulacji.
+        """
+        if self.anchor_wall is None:
+            self.start()
+
+        self.tick += 1
+        now = time.perf_counter()
+        self.lag = now - self._deadline(self.tick)
+
+        if self.lag <= 0:
+            time.sleep(-self.lag)
+            self.lag = 0.0
+            return 0
+
+        self.late_ticks += 1
+        self.total_overrun += self.lag
+        self.max_lag = max(self.max_lag, self.lag)
+
+        if self.policy == "drop":
+            dropped = int(self.lag / self.period())
+            self.tick += dropped
+            self.dropped_ticks += dropped
+            return dropped
+
+        if self.lag > self.max_lag_seconds:
+            # Zaległości są zbyt duże, by je nadrobić - zaczynamy odliczanie od nowa
+            self._rebase(now)
+            self.resyncs += 1
+        return 0
+
+    def get_stats(self):
+        """Zwraca statystyki opóźnień harmonogramu."""
+        return {
+            "ticks": self.tick,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "mean_overrun": self.total_overrun / self.late_ticks if self.late_ticks else 0.0,
+            "late_ticks": self.late_ticks,
+            "dropped_ticks": self.dropped_ticks,
+            "resyncs": self.resyncs,
+        }
@@ -2,22 +2,27 @@ import json
 import math
 import random
 import threading
-import time
 import os
 from datetime import datetime, timedelta
-from DBConnector import DBConnector
-from animals import (
-    create_animal_location,
-    generate_route_for_animal,
-    get_location_from_route,
-    generate_route_with_path
-)
-from routes import create_map_sample
+
+import numpy as np
+
+from DBConnector import ConnectionPool, load_db_params
+from db_writer import WriterLanes
+from live_server import LiveServer
+from animals import AnimalTrajectoryStream
+from routes import RouteGraph, create_map_sample
+from scheduler import TickScheduler
+from sinks import (ColumnarSink, DBSink, DisplaySink, HistorySink, JsonSnapshotSink, LiveBufferSink, OutputPipeline,
+                   TickRecords)
+from tourist_engine import VectorTouristEngine
 import tourists
-from weather import get_weather_by_minute, save_weather_station_to_file
+from weather import WeatherTensor, format_weather_station, get_weather_by_minute, get_weather_timeline
 from weather_events import load_weather_events
 import simulation_db
 
+MAX_CROSSINGS_PER_TICK = 100  # Ograniczenie przejść między szlakami w jednym kroku (np. przy bardzo długich krokach)
+
 
 class Simulation:
     def __init__(self, config_file="config.json"):
@@ -29,14 +34,25 @@ class Simulation:
         self.running = False
         self.thread = None
         self.delay_seconds = 10
+        self.config_file = config_file
         self.load_config(config_file)
-        self.animal_routes = {}
+        self.animal_trajectories = None  # trasy zwierząt generowane strumieniowo (animals.AnimalTrajectoryStream)
         self.tourists_dict = {}
+        self.tourist_engine = None  # VectorTouristEngine, gdy w konfiguracji "tourist_engine": "numpy"
         self.weather_events = load_weather_events()
+        self.weather_tensor = None  # pogoda policzona z góry (weather.WeatherTensor)
         self.routes = []
+        self.route_graph = None  # graf skrzyżowań szlaków (routes.RouteGraph)
+        self.route_graph_stale = False
         self.entrances = []
-        self.db = DBConnector()
+        self.db_pool = None  # pula połączeń (DBConnector.ConnectionPool), tworzona przy pierwszym użyciu
+        self.references = simulation_db.ReferenceRegistry()  # encje, o których wiemy, że są już w bazie
         self.save_to_db = False  # domyślnie nie zapisujemy do bazy
+        self.max_speed = False  # tryb wsadowy: bez odmierzania czasu rzeczywistego
+        self.scheduler = None
+        self.db_writer = None  # zapis do bazy w tle (db_writer.WriterLanes)
+        self.output = None  # ujścia rekordów kolejnych kroków (sinks.OutputPipeline)
+        self.live_server = None  # serwer podglądu na żywo (live_server.LiveServer), gdy włączone jest ujście "display"
 
     def load_config(self, config_file):
         with open(config_file, "r", encoding="utf-8") as f:
@@ -46,6 +62,35 @@ class Simulation:
         self.animal_ids = [f"{animal['type']}-{i:04}" for i, animal in enumerate(self.animals, start=1)]
         self.time_multiplier = config.get("time_multiplier", 1.0)
         self.tourist_spawn_chance = config.get("tourist_spawn_chance", 10)
+        self.animal_points_per_hour = config.get("animal_points_per_hour", 100)
+        self.animal_chunk_hours = config.get("animal_chunk_hours", 1)
+        self.animal_lookahead_hours = config.get("animal_lookahead_hours", 1)
+        self.tick_policy = config.get("tick_policy", "catch_up")
+        self.max_lag_seconds = config.get("max_lag_seconds", 5.0)
+        self.tourist_engine_name = config.get("tourist_engine", "objects")
+        self.precompute_weather = config.get("precompute_weather", False)
+        self.db_queue_max_rows = config.get("db_queue_max_rows", 200000)
+        self.db_flush_rows = config.get("db_flush_rows", 5000)
+        self.db_flush_seconds = config.get("db_flush_seconds", 2.0)
+        self.db_backpressure = config.get("db_backpressure", "block")
+        self.db_commit_every_ticks = config.get("db_commit_every_ticks", 1)
+        self.db_parallel_writers = config.get("db_parallel_writers", False)
+        self.db_copy_min_rows = config.get("db_copy_min_rows", 500)
+        self.db_pool_size = config.get("db_pool_size", 8)
+        self.db_params = load_db_params(config)
+        self.output_sinks = config.get("output_sinks", ["json_snapshot"])
+        # Domyślnie osobna historia dla każdego przebiegu; historia o stałej nazwie (history_file) jest zastępowana
+        self.history_file = config.get("history_file")
+        self.history_max_bytes = config.get("history_max_bytes", 64 * 1024 * 1024)
+        self.columnar_dir = config.get("columnar_dir", "trajectories")
+        self.columnar_row_group_ticks = config.get("columnar_row_group_ticks", 60)
+        self.columnar_format = config.get("columnar_format")  # "parquet" / "npz"; domyślnie parquet, gdy jest pyarrow
+        self.live_buffer_file = config.get("live_buffer_file", "live_positions.bin")
+        self.live_buffer_slots = config.get("live_buffer_slots", 4)
+        self.live_buffer_capacity = config.get("live_buffer_capacity", 4096)
+        # Ujście "display" udostępnia stan przez serwer podglądu (live_server); port None wyłącza serwer
+        self.live_server_host = config.get("live_server_host", "127.0.0.1")
+        self.live_server_port = config.get("live_server_port", 8000)
 
         start_time_str = config.get("start_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         self.initial_sim_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
@@ -54,6 +99,22 @@ class Simulation:
         duration_hours = config.get("duration_hours", 1)
         self.end_sim_time = self.initial_sim_time + timedelta(hours=duration_hours)
 
+    @property
+    def db(self):
+        """Połączenie z bazą bieżącego wątku (wątek GUI i wątek symulacji mają osobne połączenia)."""
+        return self.get_db_pool().connector()
+
+    def get_db_pool(self):
+        if self.db_pool is None:
+            self.db_pool = ConnectionPool(self.db_params, max_connections=self.db_pool_size)
+        return self.db_pool
+
+    def close_db(self):
+        """Zamyka wszystkie połączenia z bazą."""
+        if self.db_pool:
+            self.db_pool.close()
+            self.db_pool = None
+
     def setup(self):
         if not os.path.exists("map_sample.json"):
             map_sample = create_map_sample()
@@ -67,178 +128,238 @@ class Simulation:
         self.raster_map = map_sample.get("rasterMap")
         self.special_places = map_sample["specialPlaces"]
         self.bts_stations = map_sample["btsStations"]
-        self.routes = map_sample["routes"]
-        self.entrances = [r for r in self.routes if r.get("isEntrance", False)]
-        for e in self.entrances:
-            if "number" not in e:
-                raise ValueError(f"Trasa wejściowa {e} nie ma klucza 'number'")
+        self.set_routes(map_sample["routes"])
+
+        if self.tourist_engine_name == "numpy":
+            self.tourist_engine = VectorTouristEngine(self.route_graph, self.special_places,
+                                                      seed=random.getrandbits(32))
+        elif self.tourist_engine_name != "objects":
+            raise ValueError(f"Nieznany silnik turystów: {self.tourist_engine_name}")
 
         if self.save_to_db:
             # DODAWANIE MAPY DO BAZY, GDY TAKIEJ NIE MA
-            self.map_conflict = simulation_db.check_map_conflict(self.db, self.map_name)
+            self.map_conflict = self.references.contains("map", self.map_name)
             if not self.map_conflict:
                 print("Dodaje nową mapę")
-                canvas_w = self.raster_map["canvasWidthHeight"]["a"]
-                canvas_h = self.raster_map["canvasWidthHeight"]["b"]
-                simulation_db.insert_map(self.db, self.map_name, canvas_w, canvas_h)
-
-                next_place_id = simulation_db.get_first_index_of(self.db, "place_id", "special_place")
-                num = 1
-                for place in self.special_places:
-                    simulation_db.insert_special_place(self.db, next_place_id, place.get("radius"),
-                                                       place.get("coordinates", {}).get("longitude"),
-                                                       place.get("coordinates", {}).get("longitude"))
-                    simulation_db.link_special_place_to_map(self.db, next_place_id, self.map_name, num)
-                    next_place_id += 1
-                    num += 1
-
-                next_bts_id = simulation_db.get_first_index_of(self.db, "bts_station_id", "bts_station")
-                num = 1
-                for bts in self.bts_stations:
-                    simulation_db.insert_bts_station(self.db, next_bts_id, bts.get("coordinates", {}).get("longitude"),
-                                                     bts.get("coordinates", {}).get("longitude"))
-                    simulation_db.link_bts_station_to_map(self.db, next_bts_id, self.map_name, num)
-                    next_bts_id += 1
-                    num += 1
-
-                with open("map_sample.json", "r") as f:
-                    map_data = json.load(f)
-
-                map_name = map_data["mapName"]
-                for route in map_data["routes"]:
-                    simulation_db.insert_route_with_points(self.db, map_name, route)
+                simulation_db.import_map(self.db, map_sample, self.references)
+                self.references.add("map", self.map_name)
+                for detector in map_sample.get("detectors", []):
+                    self.references.add("weather_station", f"station-{detector['detectorNumber']:04d}")
 
             simulation_db.insert_simulated_map(self.db, self.next_id, self.map_name)
         else:
             self.map_conflict = True  # żeby uniknąć użycia w run()
 
-        end_time = self.initial_sim_time + timedelta(hours=1)
-        NUM_POINTS = 100
-        for aid, animal in zip(self.animal_ids, self.animals):
+        if self.precompute_weather:
+            num_minutes = int(self.get_total_duration() // 60) + 1
+            self.weather_tensor = WeatherTensor.precompute(get_weather_timeline(), num_minutes,
+                                                           rng=np.random.default_rng(random.getrandbits(32)))
+
+        paths = []
+        for animal in self.animals:
             rn = animal.get("route_number", 0)
-            if rn:
-                pts = next(r for r in map_sample["routes"] if r["number"] == rn)["points"]
-                rd = generate_route_with_path(
-                    aid, self.initial_sim_time, end_time,
-                    NUM_POINTS, pts,
-                    start_longitude=animal.get("start_longitude"),
-                    start_latitude=animal.get("start_latitude")
-                )
-            else:
-                rd = generate_route_for_animal(
-                    aid, self.initial_sim_time, end_time,
-                    NUM_POINTS,
-                    start_longitude=animal.get("start_longitude"),
-                    start_latitude=animal.get("start_latitude")
-                )
-            self.animal_routes[aid] = rd["route"]
+            paths.append(self.route_graph.get(rn).points if rn else None)
+        self.animal_trajectories = AnimalTrajectoryStream(
+            self.animal_ids, self.initial_sim_time,
+            [animal.get("start_longitude") for animal in self.animals],
+            [animal.get("start_latitude") for animal in self.animals],
+            paths=paths,
+            points_per_hour=self.animal_points_per_hour,
+            chunk=timedelta(hours=self.animal_chunk_hours),
+            lookahead=timedelta(hours=self.animal_lookahead_hours),
+            rng=np.random.default_rng(random.getrandbits(32))
+        )
+
+    def set_routes(self, routes):
+        """Ustawia trasy mapy i buduje dla nich graf skrzyżowań."""
+        for r in routes:
+            if r.get("isEntrance", False) and "number" not in r:
+                raise ValueError(f"Trasa wejściowa {r} nie ma klucza 'number'")
+        self.routes = routes
+        self.route_graph = RouteGraph(routes)
+        self.entrances = [r for r in routes if r.get("isEntrance", False)]
+        if self.tourist_engine:
+            self.tourist_engine.set_route_graph(self.route_graph)
+
+    def invalidate_route_graph(self):
+        """Oznacza graf skrzyżowań jako nieaktualny (np. po edycji tras w GUI); przebudowa w następnym kroku."""
+        self.route_graph_stale = True
+
+    def reload_routes(self):
+        """Wczytuje ponownie trasy z map_sample.json i przebudowuje graf skrzyżowań."""
+        with open("map_sample.json", "r", encoding="utf-8") as f:
+            self.set_routes(json.load(f)["routes"])
+        # Silnik wektorowy przycina odległości sam (set_route_graph); turyści-obiekty po skróceniu
+        # trasy nie mogą stać za jej końcem
+        for tourist in self.tourists_dict.values():
+            geometry = self.route_graph.get(tourist.current_route_number)
+            if geometry:
+                tourist.set_distance(min(tourist.distance, geometry.length))
+        self.route_graph_stale = False
 
     def run(self):
+        if self.save_to_db:
+            self.db.connect()
         self.setup()
+        self.output = self.create_output_pipeline()
         location_sim = ActorsLocationSimulator(self)
-        link_to_map = not self.map_conflict if self.save_to_db else False
 
-        if self.save_to_db:
-            curr_reading_id = simulation_db.get_first_index_of(self.db, "reading_id", "weather_reading")
-        else:
-            curr_reading_id = None
+        self.scheduler = TickScheduler(self.delay_seconds, self.time_multiplier,
+                                       policy=self.tick_policy, max_lag_seconds=self.max_lag_seconds)
+        self.scheduler.start()
+        tick_delta = self.delay_seconds
+        ticks = 0
 
         while self.running and self.sim_time <= self.end_sim_time:
+            if self.save_to_db and not self.db.in_transaction:
+                # Zapisy z db_commit_every_ticks kolejnych kroków idą w jednej transakcji
+                self.db.begin()
+            if self.route_graph_stale:
+                self.reload_routes()
             minute_of_sim = int((self.sim_time - self.initial_sim_time).total_seconds() / 60)
-            weather_station = get_weather_by_minute(minute_of_sim)
-            save_weather_station_to_file(weather_station)
-
-            if self.save_to_db:
-                try:
-                    with open("weather_station.json", "r", encoding="utf-8") as f:
-                        weather_station_init_data = json.load(f)
-
-                    for station in weather_station_init_data:
-                        conflict = simulation_db.check_weather_station_conflict(self.db, station["stationId"])
-                        if not conflict:
-                            simulation_db.insert_weather_station(self.db, station)
-                            link_to_map = True
-                        if link_to_map:
-                            simulation_db.link_weather_station_to_map(self.db, station, self.map_name)
-                            link_to_map = False
-                        simulation_db.insert_weather_record(
-                            self.db, station, self.sim_time, self.next_id, curr_reading_id
-                        )
-                        curr_reading_id += 1
-                except Exception as e:
-                    print(f"[BŁĄD POGODY] {e}")
-
-            location_sim.start_updating_animal_locations(self.delay_seconds)
+            if self.weather_tensor:
+                weather_station = self.weather_tensor.get_weather_by_minute(minute_of_sim)
+            else:
+                weather_station = get_weather_by_minute(minute_of_sim)
+            weather = format_weather_station(weather_station)
+            animals = location_sim.create_animal_locations()
 
             # generowanie turystów
+            spawned = []
             for e in self.entrances:
                 if random.uniform(0, 100) < e.get("spawn_chance", self.tourist_spawn_chance):
                     new_phone = f"+48{random.randint(100000000, 999999999)}"
-                    t = tourists.Tourist(new_phone, route_number=e["number"])
-                    lon, lat = e["points"][0]["longitude"], e["points"][0]["latitude"]
-                    t.set_coordinates(lon, lat, e["number"], 0)
-                    self.tourists_dict[new_phone] = t
-                    if self.save_to_db:
-                        t.insert_tourist_into_database(self.next_id, self.db)
-
-            tourists_list = list(self.tourists_dict.values())
-            timestamp = location_sim.get_timestamp()
-            location_sim.start_updating_tourist_locations(self.delay_seconds)
-
-            with open("tourist_location.json", "w", encoding="utf-8") as f:
-                json.dump([
-                    t.create_location(
-                        longitude=t.last_location[0],
-                        latitude=t.last_location[1],
-                        loc_type="GPS" if t.gps_enabled else "BTS",
-                        timestamp=timestamp
-                    ) for t in tourists_list
-                ], f, indent=4)
-
-            if self.save_to_db and tourists_list:
-                with open("tourist_location.json", "r", encoding="utf-8") as f:
-                    tourists_j = json.load(f)
-
-                loc_id_start = simulation_db.get_first_index_of_location(self.db)
-                simulation_db.bulk_insert_tourist_locations(
-                    self.db, self.next_id, tourists_j, loc_id_start
-                )
+                    if self.tourist_engine:
+                        gps_enabled = self.tourist_engine.spawn(new_phone, e["number"])
+                    else:
+                        t = tourists.Tourist(new_phone, route_number=e["number"])
+                        lon, lat = e["points"][0]["longitude"], e["points"][0]["latitude"]
+                        t.set_coordinates(lon, lat, e["number"], 0)
+                        self.tourists_dict[new_phone] = t
+                        gps_enabled = t.gps_enabled
+                    spawned.append((new_phone, gps_enabled))
 
-            print(f"[SIM TIME] {self.sim_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            timestamp = location_sim.get_timestamp()
+            location_sim.start_updating_tourist_locations(tick_delta)
+            tourist_locations = location_sim.create_tourist_locations(timestamp)
+
+            self.output.emit(TickRecords(self.sim_time, weather, animals, tourist_locations, spawned))
+
+            status = ""
+            if self.scheduler.lag > 0:
+                status += f" (opóźnienie {self.scheduler.lag:.2f} s)"
+            if self.db_writer:
+                status += f" [kolejka DB: {self.db_writer.get_stats()['queue_depth']}]"
+            print(f"[SIM TIME] {self.sim_time.strftime('%Y-%m-%d %H:%M:%S')}{status}")
+            ticks += 1
+            if self.save_to_db and ticks % self.db_commit_every_ticks == 0:
+                self.db.commit()
             self.sim_time += timedelta(seconds=self.delay_seconds)
-            time.sleep(self.delay_seconds / self.time_multiplier)
-
+            tick_delta = self.delay_seconds
+            if not self.max_speed:
+                dropped = self.scheduler.wait()
+                if dropped:
+                    # Porzucone kroki - następny krok obejmuje cały zaległy czas
+                    self.sim_time += timedelta(seconds=dropped * self.delay_seconds)
+                    tick_delta += dropped * self.delay_seconds
+
+        if not self.max_speed:
+            stats = self.scheduler.get_stats()
+            print(f"[HARMONOGRAM] spóźnione kroki: {stats['late_ticks']}, porzucone: {stats['dropped_ticks']}, "
+                  f"maks. opóźnienie: {stats['max_lag']:.2f} s, średnie: {stats['mean_overrun']:.2f} s")
+        if self.save_to_db and self.db.in_transaction:
+            self.db.commit()
+        self.output.close()
+        if self.live_server:
+            self.live_server.stop()
+            self.live_server = None
+        self.close_db_writer()
+        if self.save_to_db:
+            self.db.disconnect()
         self.stop()
 
+    def create_output_pipeline(self):
+        """Tworzy ujścia rekordów włączone w konfiguracji ("output_sinks") oraz zapis do bazy."""
+        pipeline = OutputPipeline()
+        for name in self.output_sinks:
+            if name == JsonSnapshotSink.name:
+                pipeline.add(JsonSnapshotSink())
+            elif name == HistorySink.name:
+                history_file = self.history_file or os.path.join(
+                    "history", f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson")
+                pipeline.add(HistorySink(history_file, self.history_max_bytes))
+            elif name == ColumnarSink.name:
+                pipeline.add(ColumnarSink(self.columnar_dir, self.columnar_row_group_ticks, self.columnar_format))
+            elif name == LiveBufferSink.name:
+                pipeline.add(LiveBufferSink(self.live_buffer_file, self.live_buffer_slots, self.live_buffer_capacity))
+            elif name == DisplaySink.name:
+                display = pipeline.add(DisplaySink())
+                if self.live_server_port:
+                    live_server = LiveServer(display, self.live_server_host, self.live_server_port)
+                    if live_server.start():
+                        self.live_server = live_server
+            else:
+                raise ValueError(f"Nieznane ujście danych: {name}")
+        if self.save_to_db:
+            pipeline.add(DBSink(self))
+        return pipeline
+
     def start(self):
         if not self.running:
-            with open("config.json", "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-
             if self.save_to_db:
                 if not self.db.connection:
                     self.db.connect()
-                    self.next_id = simulation_db.get_first_index(self.db)
+                    self.next_id = simulation_db.allocate_simulation_id(self.db)
+                if not self.references.warmed:
+                    self.references.warm(self.db)
 
-                start_dt = datetime.strptime(cfg["start_time"], "%Y-%m-%d %H:%M:%S")
-                dur_td = timedelta(hours=cfg["duration_hours"])
-                dur_time = (datetime.min + dur_td).time()
-                end_dt = start_dt + dur_td
-                end_epoch = end_dt.strftime("%Y-%m-%d %H:%M:%S")
+                start_dt = self.initial_sim_time
+                dur_time = (datetime.min + (self.end_sim_time - start_dt)).time()
+                end_epoch = self.end_sim_time.strftime("%Y-%m-%d %H:%M:%S")
 
-                # Wstawienie rekordu symulacji
-                simulation_db.insert_simulation(self.db, self.next_id, start_dt, dur_time, end_epoch)
+                with self.db.unit_of_work():
+                    # Wstawienie rekordu symulacji
+                    simulation_db.insert_simulation(self.db, self.next_id, start_dt, dur_time, end_epoch)
 
-                # Wstawienie zwierząt i powiązań
-                for aid in self.animal_ids:
-                    simulation_db.insert_animal(self.db, aid)
-                    simulation_db.link_animal_to_simulation(self.db, aid, self.next_id)
+                    # Wstawienie zwierząt i powiązań
+                    new_animals = [aid for aid in self.animal_ids if not self.references.contains("animal", aid)]
+                    simulation_db.register_animals(self.db, self.next_id, self.animal_ids, new_animals)
+                    for aid in new_animals:
+                        self.references.add("animal", aid)
+
+                self.start_db_writer()
 
             self.running = True
             self.thread = threading.Thread(target=self.run)
             self.thread.start()
             print("Symulacja rozpoczęta.")
 
+    def start_db_writer(self):
+        """Uruchamia wątki zapisu do bazy, każdy z osobnym połączeniem z puli."""
+        def connect():
+            writer_db = self.get_db_pool().new_connector()
+            writer_db.connect()
+            return writer_db
+
+        # Tory są niezależne: lokalizacje każdego toru odwołują się tylko do jego własnych wierszy
+        lanes = ("weather", "animals", "tourists") if self.db_parallel_writers else ("main",)
+        self.db_writer = WriterLanes(connect, lanes, max_queue_rows=self.db_queue_max_rows,
+                                     flush_rows=self.db_flush_rows, flush_seconds=self.db_flush_seconds,
+                                     policy=self.db_backpressure, copy_min_rows=self.db_copy_min_rows)
+        self.db_writer.start()
+
+    def close_db_writer(self):
+        """Zapisuje zaległe wiersze, kończy wątek zapisu i wypisuje statystyki kolejki."""
+        if not self.db_writer:
+            return
+        self.db_writer.close()
+        stats = self.db_writer.get_stats()
+        print(f"[ZAPIS DB] wierszy: {stats['written_rows']}, paczek: {stats['flushes']}, "
+              f"maks. kolejka: {stats['max_queue_depth']}, porzucone: {stats['dropped_rows']}, "
+              f"na dysk: {stats['spilled_rows']}, blokada: {stats['blocked_seconds']:.2f} s, "
+              f"błędy zapisu: {stats['errors']}")
+        self.db_writer = None
+
     def stop(self):
         if self.running:
             self.running = False
@@ -246,12 +367,14 @@ class Simulation:
 
     def reset(self):
         self.stop()
-        self.load_config("config.json")
+        self.load_config(self.config_file)
         self.sim_time = self.initial_sim_time
         self.tourists_dict.clear()
-        self.animal_routes = {}
-        if self.db.connection:
-            self.db.disconnect()
+        self.tourist_engine = None
+        self.animal_trajectories = None
+        self.weather_tensor = None
+        self.close_db()
+        self.references = simulation_db.ReferenceRegistry()
         for fname in ("animal_locations.json", "tourist_location.json"):
             with open(fname, "w", encoding="utf-8") as f:
                 json.dump([], f)
@@ -267,8 +390,14 @@ class Simulation:
     def is_running(self):
         return self.running
 
+    def get_lag(self):
+        """Bieżące opóźnienie czasu rzeczywistego względem harmonogramu (w sekundach)."""
+        return self.scheduler.lag if self.scheduler else 0.0
+
     def set_time_multiplier(self, new_multiplier: float):
         self.time_multiplier = new_multiplier
+        if self.scheduler:
+            self.scheduler.set_time_multiplier(new_multiplier)
         print(f"[SIMULATION] Nowy mnożnik czasu: {new_multiplier}")
 
 
@@ -282,12 +411,28 @@ class ActorsLocationSimulator:
         return self.simulation.sim_time.strftime("%Y-%m-%d %H:%M:%S.%f")
 
     def start_updating_tourist_locations(self, delta):
+        if self.simulation.tourist_engine:
+            self.simulation.tourist_engine.step(delta)
+            return
         tourists = list(self.simulation.tourists_dict.values())
         self.update_tourists_locations(delta, tourists)
         self.determine_signal_strength()
         self.update_gps_coordinates()
         self.update_nearest_detector(tourists)
 
+    def create_tourist_locations(self, timestamp):
+        """Zwraca bieżące lokalizacje wszystkich turystów (niezależnie od silnika)."""
+        if self.simulation.tourist_engine:
+            return self.simulation.tourist_engine.create_locations(timestamp)
+        return [
+            t.create_location(
+                longitude=t.last_location[0],
+                latitude=t.last_location[1],
+                loc_type="GPS" if t.gps_enabled else "BTS",
+                timestamp=timestamp
+            ) for t in self.simulation.tourists_dict.values()
+        ]
+
     def update_tourists_locations(self, delta, tourists):
         for tourist in tourists:
             self.manage_tourist_movement(tourist, delta)
@@ -304,27 +449,59 @@ class ActorsLocationSimulator:
             self.move_tourist_randomly(tourist, delta)
             return
 
-        route = next(
-            (r for r in self.simulation.routes if r["number"] == tourist.current_route_number),
-            None
-        )
+        route = self.simulation.route_graph.get(tourist.current_route_number)
         if not route:
             print(f"Brak trasy {tourist.current_route_number} dla turysty {tourist.phone_id}")
             return
 
-        route_points = route["points"]
-        from_point = route_points[tourist.current_point_index]
-        next_index = tourist.current_point_index + tourist.direction
+        tourist.update_speed()
+        distance = delta * tourist.current_speed
+        if tourist.is_out_of_route:
+            distance = self.return_to_route(tourist, route, distance)
+            if tourist.is_out_of_route:
+                return
 
-        if 0 <= next_index < len(route_points):
-            to_point = route_points[next_index]
-            new_location = self.calculate_next_point(tourist, tourist.get_last_location(), to_point, delta)
-            if new_location == [to_point["longitude"], to_point["latitude"]]:
-                tourist.set_coordinates(new_location[0], new_location[1], tourist.current_route_number, next_index)
-            else:
-                tourist.set_coordinates(new_location[0], new_location[1], tourist.current_route_number, tourist.current_point_index)
-        else:
-            self.manage_crossings(tourist, route)
+        # Ruch wzdłuż trasy - nadmiar dystansu przechodzi przez kolejne punkty i skrzyżowania
+        crossings = 0
+        while distance > 0:
+            to_end = route.length - tourist.distance if tourist.direction == 1 else tourist.distance
+            if distance < to_end:
+                tourist.set_distance(tourist.distance + tourist.direction * distance)
+                break
+            tourist.set_distance(route.length if tourist.direction == 1 else 0.0)
+            distance -= to_end
+            route = self.manage_crossings(tourist, route)
+            if route is None:
+                return
+            crossings += 1
+            if crossings >= MAX_CROSSINGS_PER_TICK:
+                break
+
+        lon, lat, segment = route.point_at(tourist.distance, tourist.current_point_index)
+        tourist.set_coordinates(lon, lat, route.number, segment)
+
+    def return_to_route(self, tourist, route, distance):
+        """
+        Prowadzi turystę, który odnalazł drogę, z powrotem do miejsca na trasie, w którym ją zgubił.
+
+        Returns:
+            float: Dystans, który pozostał do przejścia po powrocie na trasę.
+        """
+        target_lon, target_lat, segment = route.point_at(tourist.distance, tourist.current_point_index)
+        current = tourist.get_last_location()
+        dx = target_lon - current[0]
+        dy = target_lat - current[1]
+        total_distance = math.hypot(dx, dy)
+
+        if total_distance <= distance:
+            tourist.set_coordinates(target_lon, target_lat, route.number, segment)
+            tourist.set_out_of_route(False)
+            return distance - total_distance
+
+        ratio = distance / total_distance
+        tourist.set_coordinates(current[0] + dx * ratio, current[1] + dy * ratio,
+                                tourist.current_route_number, tourist.current_point_index)
+        return 0.0
 
     def move_tourist_randomly(self, tourist, delta):
         tourist.update_speed()
@@ -342,123 +519,62 @@ class ActorsLocationSimulator:
         new_y = current_location[1] + dy
 
         tourist.set_coordinates(new_x, new_y, tourist.current_route_number, tourist.current_point_index)
-    def calculate_next_point(self, tourist, from_point, to_point, delta):
-        tourist.update_speed()
-        speed = tourist.current_speed
-        distance = delta * speed
-        current_location = from_point if isinstance(from_point, list) else [from_point["longitude"], from_point["latitude"]]
-
-        target_location = [to_point["longitude"], to_point["latitude"]]
-
-        dx = target_location[0] - current_location[0]
-        dy = target_location[1] - current_location[1]
-        total_distance = (dx**2 + dy**2)**0.5
-
-        if total_distance <= distance or total_distance < 1e-6:
-            return target_location
-        else:
-            ratio = distance / total_distance
-            new_x = current_location[0] + dx * ratio
-            new_y = current_location[1] + dy * ratio
-            return [new_x, new_y]
-
-    def find_nearby_routes(self, current_route_number, current_point):
-        """Znajduje szlaki, których punkty początkowe lub końcowe są blisko danego punktu."""
-        MAX_DISTANCE = 10.0  # Maksymalna odległość w pikselach
-        nearby_routes = []
-
-        current_x = current_point["longitude"]
-        current_y = current_point["latitude"]
-
-        for route in self.simulation.routes:
-            if route["number"] == current_route_number:
-                continue
-
-            points = route["points"]
-            start_point = points[0]
-            end_point = points[-1]
-
-            # Sprawdź odległość do punktu początkowego
-            start_distance = ((current_x - start_point["longitude"])**2 + (current_y - start_point["latitude"])**2)**0.5
-            if start_distance <= MAX_DISTANCE:
-                nearby_routes.append({
-                    "route_number": route["number"],
-                    "point_index": 0,
-                    "direction": 1  # Idzie w przód
-                })
-
-            # Sprawdź odległość do punktu końcowego
-            end_distance = ((current_x - end_point["longitude"])**2 + (current_y - end_point["latitude"])**2)**0.5
-            if end_distance <= MAX_DISTANCE:
-                nearby_routes.append({
-                    "route_number": route["number"],
-                    "point_index": len(points) - 1,
-                    "direction": -1  # Idzie wstecz
-                })
-
-        return nearby_routes
+        tourist.set_out_of_route(True)
 
     def manage_crossings(self, tourist, current_route):
-        route_points = current_route["points"]
+        """
+        Obsługuje turystę, który dotarł do końca trasy: przejście na pobliski szlak,
+        zawrócenie albo wyjście z mapy.
+
+        Returns:
+            RouteGeometry: Trasa, po której turysta idzie dalej, lub None, jeśli opuścił mapę.
+        """
+        route_graph = self.simulation.route_graph
 
         # Turysta dotarł do końca trasy (kierunek w przód)
-        if tourist.direction == 1 and tourist.current_point_index == len(route_points) - 1:
-            nearby_routes = self.find_nearby_routes(current_route["number"], route_points[-1])
+        if tourist.direction == 1:
+            nearby_routes = route_graph.get_transitions(current_route.number, at_end=True)
             if nearby_routes:
-                # Wybierz losowo inny szlak z pobliskich
-                new_route_info = random.choice(nearby_routes)
-                new_route_number = new_route_info["route_number"]
-                new_route = next(r for r in self.simulation.routes if r["number"] == new_route_number)
-
-                new_point_index = new_route_info["point_index"]
-                new_direction = new_route_info["direction"]
-
-                tourist.set_coordinates(
-                    new_route["points"][new_point_index]["longitude"],
-                    new_route["points"][new_point_index]["latitude"],
-                    new_route_number,
-                    new_point_index
-                )
-                tourist.set_direction(new_direction)
-                print(f"Turysta {tourist.phone_id} przeszedł z trasy {current_route['number']} na trasę {new_route_number}")
-                return
+                return self.switch_route(tourist, current_route, random.choice(nearby_routes))
 
             # Jeśli nie ma pobliskich szlaków, turysta zawraca
             tourist.set_direction(-1)
-            print(f"Turysta {tourist.phone_id} zawrócił na trasie {current_route['number']} (koniec trasy)")
+            print(f"Turysta {tourist.phone_id} zawrócił na trasie {current_route.number} (koniec trasy)")
+            return current_route
 
         # Turysta dotarł do początku trasy (kierunek w tył)
-        elif tourist.direction == -1 and tourist.current_point_index == 0:
-            if current_route.get("isEntrance", False):
-                # Wyjście z mapy tylko na początku tras wejściowych
-                tourist.stats["exit_time"] = datetime.now()
-                tourist.stats["exit_type"] = "normal_exit"
-                print(f"Turysta {tourist.phone_id} opuścił mapę na początku trasy {current_route['number']}")
-                del self.simulation.tourists_dict[tourist.phone_id]
-            else:
-                nearby_routes = self.find_nearby_routes(current_route["number"], route_points[0])
-                if nearby_routes:
-                    # Wybierz losowo inny szlak z pobliskich
-                    new_route_info = random.choice(nearby_routes)
-                    new_route_number = new_route_info["route_number"]
-                    new_route = next(r for r in self.simulation.routes if r["number"] == new_route_number)
-
-                    new_point_index = new_route_info["point_index"]
-                    new_direction = new_route_info["direction"]
-
-                    tourist.set_coordinates(
-                        new_route["points"][new_point_index]["longitude"],
-                        new_route["points"][new_point_index]["latitude"],
-                        new_route_number,
-                        new_point_index
-                    )
-                    tourist.set_direction(new_direction)
-                    print(f"Turysta {tourist.phone_id} przeszedł z trasy {current_route['number']} na trasę {new_route_number}")
-                    return
-
-                # Jeśli nie ma pobliskich szlaków, turysta zawraca
-                tourist.set_direction(1)
-                print(f"Turysta {tourist.phone_id} zawrócił na trasie {current_route['number']} (początek trasy)")
+        if current_route.is_entrance:
+            # Wyjście z mapy tylko na początku tras wejściowych
+            tourist.stats["exit_time"] = datetime.now()
+            tourist.stats["exit_type"] = "normal_exit"
+            print(f"Turysta {tourist.phone_id} opuścił mapę na początku trasy {current_route.number}")
+            del self.simulation.tourists_dict[tourist.phone_id]
+            return None
+
+        nearby_routes = route_graph.get_transitions(current_route.number, at_end=False)
+        if nearby_routes:
+            return self.switch_route(tourist, current_route, random.choice(nearby_routes))
+
+        # Jeśli nie ma pobliskich szlaków, turysta zawraca
+        tourist.set_direction(1)
+        print(f"Turysta {tourist.phone_id} zawrócił na trasie {current_route.number} (początek trasy)")
+        return current_route
+
+    def switch_route(self, tourist, current_route, new_route_info):
+        """Przenosi turystę na koniec wybranego pobliskiego szlaku."""
+        new_route = self.simulation.route_graph.get(new_route_info["route_number"])
+        new_point_index = new_route_info["point_index"]
+
+        tourist.set_coordinates(
+            new_route.xs[new_point_index],
+            new_route.ys[new_point_index],
+            new_route.number,
+            new_route.segment(new_route.end_distance(new_point_index), new_point_index)
+        )
+        tourist.set_distance(new_route.end_distance(new_point_index))
+        tourist.set_direction(new_route_info["direction"])
+        print(f"Turysta {tourist.phone_id} przeszedł z trasy {current_route.number} na trasę {new_route.number}")
+        return new_route
 
     def manage_leaving_the_map(self, tourist):
         # Metoda pusta, ponieważ logika opuszczania mapy została przeniesiona do manage_crossings
@@ -481,65 +597,16 @@ class ActorsLocationSimulator:
     def update_nearest_detector(self, tourists):
         pass  # Wymaga detektorów w map_sample.json
 
-    def start_updating_animal_locations(self, delta):
-        # --- faza 1: zbieramy wszystkie dane ---
-        animal_locations = []
-        location_records = []
-        animal_loc_records = []
-
-        # Jeśli zapis do bazy jest włączony, inicjalizujemy id_counter
-        if self.simulation.save_to_db:
-            id_counter = simulation_db.get_first_index_of_location(self.simulation.db)
-
-        for animal_id in self.simulation.animal_ids:
-            current = get_location_from_route(
-                self.simulation.animal_routes[animal_id],
-                self.simulation.sim_time
-            )
-            new_lon = current["longitude"] + random.uniform(-1.0, 1.0)
-            new_lat = current["latitude"] + random.uniform(-1.0, 1.0)
-            timestamp = self.simulation.sim_time.strftime("%Y-%m-%d %H:%M:%S.%f")
-
-            # Przygotowujemy słownik do pliku JSON bez danych związanych z bazą
-            loc = {
+    def create_animal_locations(self):
+        """Zwraca bieżące lokalizacje zwierząt (format animal_locations.json)."""
+        lons, lats = self.simulation.animal_trajectories.locate(self.simulation.sim_time)
+        timestamp = self.simulation.sim_time.strftime("%Y-%m-%d %H:%M:%S.%f")
+        return [
+            {
                 "animal_id": animal_id,
-                "longitude": new_lon,
-                "latitude": new_lat,
+                "longitude": lon + random.uniform(-1.0, 1.0),
+                "latitude": lat + random.uniform(-1.0, 1.0),
                 "simulated_timestamp": timestamp
             }
-            animal_locations.append(loc)
-
-            # Jeśli zapis do bazy jest włączony, przygotowujemy rekordy do tabel
-            if self.simulation.save_to_db:
-                # Dla tabeli location potrzebujemy location_id, longitude, latitude
-                location_records.append((id_counter, new_lon, new_lat))
-                # Dla tabeli animal_location potrzebujemy location_id, animal_id, simulation_id, timestamp
-                simulation_id = self.simulation.next_id
-                animal_loc_records.append((
-                    id_counter,
-                    animal_id,
-                    simulation_id,
-                    timestamp
-                ))
-                id_counter += 1
-
-        # Zapisujemy lokalizacje do pliku JSON (bez danych związanych z bazą)
-        with open("animal_locations.json", "w", encoding="utf-8") as f:
-            json.dump(animal_locations, f, indent=4)
-
-        # Jeśli zapis do bazy jest włączony, wykonujemy wstawianie danych
-        if self.simulation.save_to_db:
-            insert_loc_sql = """
-                INSERT INTO simulation_gopr.location
-                    (location_id, longitude, latitude)
-                VALUES (%s, %s, %s);
-            """
-            self.simulation.db.execute_query(insert_loc_sql, location_records)
-
-            insert_animal_loc_sql = """
-                INSERT INTO simulation_gopr.animal_location
-                    (location_id, animal_id, simulation_id, simulated_timestamp)
-                VALUES (%s, %s, %s, %s);
-            """
-            self.simulation.db.execute_query(insert_animal_loc_sql, animal_loc_records)
-
+            for animal_id, lon, lat in zip(self.simulation.animal_ids, lons.tolist(), lats.tolist())
+        ]
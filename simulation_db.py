@@ -1,132 +1,292 @@
+import threading
+import weakref
 
-def get_first_index(db):
-    sql = """
-        WITH possible_ids AS (
-            SELECT generate_series(1, (SELECT COALESCE(MAX(simulation_id),0) + 1 FROM simulation_gopr.simulation)) AS id
-        )
-        SELECT id
-        FROM possible_ids p
-        LEFT JOIN simulation_gopr.simulation s ON s.simulation_id = p.id
-        WHERE s.simulation_id IS NULL
-        ORDER BY p.id
-        LIMIT 1;
+from DBConnector import DBConnector
+
+class IdAllocator:
     """
-    return db.execute_query(sql, fetch=True)[0][0]
-
-def get_first_index_of(db, searched, source):
-    sql = f"""
-        WITH possible_ids AS (
-            SELECT generate_series(1, (SELECT COALESCE(MAX({searched}), 0) + 1 FROM simulation_gopr.{source})) AS id
-        )
-        SELECT id
-        FROM possible_ids p
-        LEFT JOIN simulation_gopr.{source} s ON s.{searched} = p.id
-        WHERE s.{searched} IS NULL
-        ORDER BY p.id
-        LIMIT 1;
+    Przydziela identyfikatory z bloków rezerwowanych w bazie.
+
+    Dla każdej pary (tabela, kolumna) w tabeli simulation_gopr.id_high_water trzymany jest
+    następny niezarezerwowany identyfikator. Rezerwacja bloku to jedno atomowe UPDATE ... RETURNING,
+    a kolejne identyfikatory z bloku wydawane są lokalnie, bez zapytań do bazy.
+    Przy pierwszej rezerwacji licznik startuje od MAX(kolumna) + 1 z danej tabeli.
+    Tabela liczników jest częścią schematu bazy (migrations/id_high_water.sql).
+
+    Rezerwacje idą osobnym połączeniem bez jednostek pracy, więc każda jest zatwierdzana
+    od razu i nie zatwierdza ani nie wycofuje transakcji połączenia, które prosi o identyfikatory.
     """
-    return db.execute_query(sql, fetch=True)[0][0]
+    HIGH_WATER_TABLE = "simulation_gopr.id_high_water"
+    DEFAULT_BLOCK_SIZE = 1000
+
+    def __init__(self, db, block_size=DEFAULT_BLOCK_SIZE):
+        self.db = db  # własne połączenie alokatora (patrz get_id_allocator)
+        self.block_size = block_size
+        self.blocks = {}  # (tabela, kolumna) -> (następny wolny, koniec bloku)
+        self.lock = threading.Lock()
+        self.counters_ready = set()  # (tabela, kolumna) z licznikiem już założonym w HIGH_WATER_TABLE
+
+    def _reserve(self, table, column, size):
+        if self.db.connection is None:
+            self.db.connect()
+        if (table, column) not in self.counters_ready:
+            # Z fetch=True błąd to None, a istniejący już licznik - pusta lista; zatwierdza UPDATE poniżej
+            seeded = self.db.execute_query(f"""
+                INSERT INTO {self.HIGH_WATER_TABLE} (table_name, column_name, next_id)
+                SELECT %s, %s, COALESCE(MAX({column}), 0) + 1 FROM simulation_gopr.{table}
+                ON CONFLICT (table_name, column_name) DO NOTHING
+                RETURNING next_id;
+            """, (table, column), fetch=True)
+            if seeded is None:
+                raise Exception(f"Nie udało się założyć licznika identyfikatorów dla {table}.{column} "
+                                f"(czy baza ma tabelę z migrations/id_high_water.sql?)")
+            self.counters_ready.add((table, column))
+        result = self.db.execute_query(f"""
+            UPDATE {self.HIGH_WATER_TABLE}
+            SET next_id = next_id + %s
+            WHERE table_name = %s AND column_name = %s
+            RETURNING next_id - %s;
+        """, (size, table, column, size), fetch=True)
+        if not result:
+            raise Exception(f"Nie udało się zarezerwować identyfikatorów dla {table}.{column}")
+        # Zapytanie z fetch=True nie zatwierdza samo - rezerwacja musi być trwała od razu
+        self.db.commit()
+        return result[0][0]
+
+    def allocate(self, table, column, count=1, block_size=None):
+        """
+        Zwraca pierwszy z count kolejnych wolnych identyfikatorów kolumny column tabeli table.
 
-def get_first_index_of_location(db):
-    sql = """
-        WITH possible_ids AS (
-            SELECT generate_series(1, (SELECT COALESCE(MAX(location_id), 0) + 1 FROM simulation_gopr.location)) AS id
-        )
-        SELECT id
-        FROM possible_ids p
-        LEFT JOIN simulation_gopr.location l ON l.location_id = p.id
-        WHERE l.location_id IS NULL
-        ORDER BY p.id
-        LIMIT 1;
+        Args:
+            table (str): Tabela w schemacie simulation_gopr.
+            column (str): Kolumna z identyfikatorem.
+            count (int): Liczba potrzebnych kolejnych identyfikatorów.
+            block_size (int, opcjonalnie): Wielkość rezerwowanego bloku (domyślnie self.block_size).
+
+        Returns:
+            int: Pierwszy identyfikator z zakresu [wynik, wynik + count).
+        """
+        key = (table, column)
+        with self.lock:
+            start, end = self.blocks.get(key, (0, 0))
+            if end - start < count:
+                size = max(count, block_size or self.block_size)
+                start = self._reserve(table, column, size)
+                end = start + size
+            self.blocks[key] = (start + count, end)
+            return start
+
+_allocators = weakref.WeakKeyDictionary()
+_allocators_lock = threading.Lock()
+
+def get_id_allocator(db):
     """
-    return db.execute_query(sql, fetch=True)[0][0]
+    Zwraca alokator identyfikatorów dla połączenia DBConnector.
 
-def check_map_conflict(db, map_name):
-    sql = """
-        SELECT m.map_name
-        FROM simulation_gopr.map m
-        WHERE m.map_name = %s
-        LIMIT 1;
+    Alokator jest wspólny dla wszystkich połączeń z tej samej puli (albo dla samego połączenia,
+    gdy nie korzysta z puli) i ma własne, osobne połączenie z bazą.
     """
-    return bool(db.execute_query(sql, (map_name,), fetch=True))
+    owner = db.pool or db
+    with _allocators_lock:
+        if owner not in _allocators:
+            if db.pool:
+                allocator_db = db.pool.new_connector()
+            else:
+                allocator_db = DBConnector(verbose=db.verbose, params=db.params)
+            _allocators[owner] = IdAllocator(allocator_db)
+        return _allocators[owner]
+
+def allocate_ids(db, searched, source, count=1):
+    """Zwraca pierwszy z count kolejnych wolnych identyfikatorów kolumny searched tabeli source."""
+    return get_id_allocator(db).allocate(source, searched, count)
+
+def allocate_location_ids(db, count=1):
+    """Zwraca pierwszy z count kolejnych wolnych identyfikatorów tabeli location."""
+    return allocate_ids(db, "location_id", "location", count)
+
+def allocate_simulation_id(db):
+    """Zwraca identyfikator nowej symulacji (bez rezerwowania bloku na zapas)."""
+    return get_id_allocator(db).allocate("simulation", "simulation_id", block_size=1)
+
+class ReferenceRegistry:
+    """
+    Encje referencyjne (mapy, stacje pogodowe, zwierzęta, turyści), o których wiadomo, że są już w bazie.
 
-def insert_map(db, map_name, canvas_width, canvas_height):
-    sql = """
-        INSERT INTO simulation_gopr.map
-            (map_name, canvas_width, canvas_height, canvas_source_file, top_left_id, down_right_id)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (map_name)
-        DO NOTHING;
+    Rejestr jest wypełniany jednym zapytaniem przy starcie (warm) i uzupełniany przy każdym
+    wstawieniu (add), więc w trakcie symulacji nie trzeba pytać bazy o istnienie rekordów.
+    Turyści nie są wczytywani przy starcie - ich tabela rośnie z każdym przebiegiem, a rejestracja
+    i tak pomija istniejących (ON CONFLICT DO NOTHING) - więc rejestr zna tylko turystów z tego przebiegu.
     """
-    db.execute_query(sql, (map_name, canvas_width, canvas_height, None, None, None), fetch=False)
-
-def insert_special_place(db, place_id, radius, longitude, latitude):
-    location_id = get_first_index_of_location(db)
-
-    sql_insert_location = """
-                    INSERT INTO simulation_gopr.location
-                    (location_id, longitude, latitude)
-                    VALUES (%s, %s, %s)
-                """
-    db.execute_query(sql_insert_location, (
-        location_id,
-        longitude,
-        latitude
-    ))
+    KINDS = ("map", "weather_station", "animal", "tourist")
+
+    def __init__(self):
+        self.known = {kind: set() for kind in self.KINDS}
+        self.warmed = False
+
+    def warm(self, db):
+        sql = """
+            SELECT 'map', map_name FROM simulation_gopr.map
+            UNION ALL
+            SELECT 'weather_station', weather_station_id FROM simulation_gopr.weather_station
+            UNION ALL
+            SELECT 'animal', animal_id FROM simulation_gopr.animal;
+        """
+        for kind in self.KINDS:
+            self.known[kind].clear()
+        for kind, key in db.execute_query(sql, fetch=True) or []:
+            self.known[kind].add(key)
+        self.warmed = True
 
-    sql = """
-        INSERT INTO simulation_gopr.special_place
-            (place_id, radius, location_id)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (place_id)
-        DO NOTHING;
+    def contains(self, kind, key):
+        return key in self.known[kind]
+
+    def add(self, kind, key):
+        self.known[kind].add(key)
+
+def import_map(db, map_data, references=None):
     """
-    db.execute_query(sql, (place_id, radius, location_id), fetch=False)
+    Wstawia całą mapę (trasy z punktami, detektory, stacje BTS, miejsca specjalne) w jednej transakcji.
 
-def link_special_place_to_map(db, place_id, map_name, place_number):
-    sql = """
-        INSERT INTO simulation_gopr.special_place_map
-            (place_id, map_name, place_number)
-        VALUES (%s, %s, %s);
+    Identyfikatory są rezerwowane z góry, a każda tabela jest wypełniana jednym zapytaniem
+    (COPY lub INSERT ... VALUES dla wielu wierszy), więc liczba zapytań nie zależy od liczby punktów.
+    Detektory mapy są zapisywane jako stacje pogodowe "station-XXXX", tak jak w weather.py;
+    stacje znane już z rejestru dostają tylko powiązanie z mapą, bez nowej lokalizacji.
+
+    Args:
+        db (DBConnector): Połączenie z bazą.
+        map_data (dict): Zawartość map_sample.json.
+        references (ReferenceRegistry, opcjonalnie): Rejestr encji będących już w bazie.
     """
-    db.execute_query(sql, (place_id, map_name, place_number), fetch=False)
+    map_name = map_data["mapName"]
+    canvas = map_data["rasterMap"]["canvasWidthHeight"]
+    places = map_data.get("specialPlaces", [])
+    bts_stations = map_data.get("btsStations", [])
+    detectors = map_data.get("detectors", [])
+    routes = map_data.get("routes", [])
+    new_detectors = [detector for detector in detectors
+                     if references is None
+                     or not references.contains("weather_station", f"station-{detector['detectorNumber']:04d}")]
+
+    num_locations = (len(places) + len(bts_stations) + len(new_detectors)
+                     + sum(len(r["points"]) for r in routes))
+    next_location_id = allocate_location_ids(db, num_locations)
+    next_place_id = allocate_ids(db, "place_id", "special_place", len(places))
+    next_bts_id = allocate_ids(db, "bts_station_id", "bts_station", len(bts_stations))
+    next_route_id = allocate_ids(db, "route_id", "route", len(routes))
 
+    location_records = []
 
+    def add_location(longitude, latitude):
+        nonlocal next_location_id
+        location_records.append((next_location_id, longitude, latitude))
+        next_location_id += 1
+        return next_location_id - 1
+
+    place_records, place_map_records = [], []
+    for num, place in enumerate(places, start=1):
+        coords = place.get("coordinates", {})
+        location_id = add_location(coords.get("longitude"), coords.get("latitude"))
+        place_records.append((next_place_id, place.get("radius"), location_id))
+        place_map_records.append((next_place_id, map_name, num))
+        next_place_id += 1
+
+    bts_records, bts_map_records = [], []
+    for num, bts in enumerate(bts_stations, start=1):
+        coords = bts.get("coordinates", {})
+        location_id = add_location(coords.get("longitude"), coords.get("latitude"))
+        bts_records.append((next_bts_id, location_id))
+        bts_map_records.append((next_bts_id, map_name, num))
+        next_bts_id += 1
+
+    station_records = []
+    for detector in new_detectors:
+        coords = detector.get("coordinates", {})
+        location_id = add_location(coords.get("longitude"), coords.get("latitude"))
+        station_records.append((f"station-{detector['detectorNumber']:04d}", location_id))
+    station_map_records = [(f"station-{detector['detectorNumber']:04d}", map_name, detector["detectorNumber"])
+                           for detector in detectors]
+
+    route_records, route_point_records = [], []
+    for route in routes:
+        route_records.append((
+            next_route_id,
+            route["number"],
+            route["difficulty"],
+            route["color"].lower(),  # DB constraint expects lowercase
+            route["isEntrance"],
+            None,  # area
+            map_name
+        ))
+        for point in route["points"]:
+            location_id = add_location(point["longitude"], point["latitude"])
+            route_point_records.append((next_route_id, location_id, point["point"]))
+        next_route_id += 1
 
-def insert_bts_station(db, station_id, longitude, latitude):
-    location_id = get_first_index_of_location(db)
+    try:
 
-    sql_insert_location = """
-                    INSERT INTO simulation_gopr.location
-                    (location_id, longitude, latitude)
-                    VALUES (%s, %s, %s)
-                """
-    db.execute_query(sql_insert_location, (
-        location_id,
-        longitude,
-        latitude
-    ))
+        db.begin()
 
-    sql = """
-        INSERT INTO simulation_gopr.bts_station
-            (bts_station_id, location_id)
-        VALUES (%s, %s)
-        ON CONFLICT (bts_station_id)
-        DO NOTHING;
-    """
-    db.execute_query(sql, (station_id, location_id), fetch=False)
-    print("dodano stację")
+        db.execute_query("""
+            INSERT INTO simulation_gopr.map
+                (map_name, canvas_width, canvas_height, canvas_source_file, top_left_id, down_right_id)
+            VALUES (%s, %s, %s, NULL, NULL, NULL)
+            ON CONFLICT (map_name)
+            DO NOTHING;
+        """, (map_name, canvas["a"], canvas["b"]))
+
+        db.copy_rows("simulation_gopr.location", ("location_id", "longitude", "latitude"), location_records)
+
+        if place_records:
+            db.execute_query("""
+                INSERT INTO simulation_gopr.special_place (place_id, radius, location_id)
+                VALUES %s
+                ON CONFLICT (place_id) DO NOTHING
+            """, place_records, use_execute_values=True)
+            db.execute_query("""
+                INSERT INTO simulation_gopr.special_place_map (place_id, map_name, place_number)
+                VALUES %s
+            """, place_map_records, use_execute_values=True)
+
+        if bts_records:
+            db.execute_query("""
+                INSERT INTO simulation_gopr.bts_station (bts_station_id, location_id)
+                VALUES %s
+                ON CONFLICT (bts_station_id) DO NOTHING
+            """, bts_records, use_execute_values=True)
+            db.execute_query("""
+                INSERT INTO simulation_gopr.bts_station_map (station_id, map_name, station_number)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, bts_map_records, use_execute_values=True)
+
+        if station_records:
+            db.execute_query("""
+                INSERT INTO simulation_gopr.weather_station (weather_station_id, location_id)
+                VALUES %s
+                ON CONFLICT (weather_station_id) DO NOTHING
+            """, station_records, use_execute_values=True)
+        if station_map_records:
+            db.execute_query("""
+                INSERT INTO simulation_gopr.weather_station_map (station_id, map_name, station_number)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, station_map_records, use_execute_values=True)
+
+        if route_records:
+            db.execute_query("""
+                INSERT INTO simulation_gopr.route
+                    (route_id, route_number, difficulty, color, is_entrance, area, map_name)
+                VALUES %s
+            """, route_records, use_execute_values=True)
+            db.copy_rows("simulation_gopr.route_point", ("route_id", "location_id", "point_number"),
+                         route_point_records)
 
-def link_bts_station_to_map(db, station_id, map_name, station_number):
-    sql = """
-        INSERT INTO simulation_gopr.bts_station_map
-            (station_id, map_name, station_number)
-        VALUES (%s, %s, %s);
-    """
-    db.execute_query(sql, (station_id, map_name, station_number), fetch=False)
-    print("polaczono stacje")
+        db.commit()
 
+    except Exception as e:
 
+        db.rollback()
+        raise Exception(f"Nie udało się zaimportować mapy: {e}")
 
 def insert_simulated_map(db, sim_id, map_name):
     sql = """
@@ -144,71 +304,45 @@ def insert_simulation(db, sim_id, start_time_dt, set_duration_time, end_time_epo
     """
     db.execute_query(sql, (sim_id, start_time_dt, set_duration_time, end_time_epoch), fetch=False)
 
-def insert_animal(db, animal_id):
-    sql = """
-        INSERT INTO simulation_gopr.animal(animal_id)
-        VALUES (%s)
-        ON CONFLICT (animal_id) DO NOTHING;
+def register_animals(db, sim_id, animal_ids, new_animal_ids=None):
     """
-    db.execute_query(sql, (animal_id,), fetch=False)
+    Rejestruje zwierzęta symulacji dwoma zapytaniami (animal i simulated_animal) zamiast dwóch na zwierzę.
 
-def link_animal_to_simulation(db, animal_id, sim_id):
-    sql = """
-        INSERT INTO simulation_gopr.simulated_animal(animal_id, simulation_id)
-        VALUES (%s, %s);
+    Args:
+        animal_ids (list of str): Wszystkie zwierzęta symulacji.
+        new_animal_ids (list of str, opcjonalnie): Zwierzęta, których nie ma jeszcze w tabeli animal
+            (domyślnie wszystkie - istniejące są pomijane przez ON CONFLICT).
     """
-    db.execute_query(sql, (animal_id, sim_id), fetch=False)
-
-def check_weather_station_conflict(db, weather_station_id):
-    sql = """
-        SELECT m.weather_station_id
-        FROM simulation_gopr.weather_station m
-        WHERE m.weather_station_id = %s
-        LIMIT 1;
+    if new_animal_ids is None:
+        new_animal_ids = animal_ids
+    if new_animal_ids:
+        db.execute_query("""
+            INSERT INTO simulation_gopr.animal(animal_id)
+            VALUES %s
+            ON CONFLICT (animal_id) DO NOTHING
+        """, [(animal_id,) for animal_id in new_animal_ids], use_execute_values=True)
+    if animal_ids:
+        db.execute_query("""
+            INSERT INTO simulation_gopr.simulated_animal(animal_id, simulation_id)
+            VALUES %s
+        """, [(animal_id, sim_id) for animal_id in animal_ids], use_execute_values=True)
+
+def weather_station_rows(station, map_name, location_id):
     """
-    return bool(db.execute_query(sql, (weather_station_id,), fetch=True))
-
-def insert_weather_station(db, station):
-    location_id = get_first_index_of_location(db)
-
-    sql_insert_location = """
-                        INSERT INTO simulation_gopr.location
-                        (location_id, longitude, latitude)
-                        VALUES (%s, %s, %s)
-                    """
-    db.execute_query(sql_insert_location, (
-        location_id,
-        station["location"]["longitude"],
-        station["location"]["latitude"]
-    ))
+    Zwraca wiersze rejestracji nowej stacji pogodowej (spoza detektorów mapy).
 
-    sql = """
-        INSERT INTO simulation_gopr.weather_station (
-            weather_station_id, location_id
-        ) VALUES (%s, %s);
+    Returns:
+        tuple: (wiersz location, wiersz weather_station, wiersz weather_station_map).
     """
-    params = (
-        station["stationId"],
-        location_id
+    return (
+        (location_id, station["location"]["longitude"], station["location"]["latitude"]),
+        (station["stationId"], location_id),
+        (station["stationId"], map_name, None),
     )
-    db.execute_query(sql, params, fetch=False)
 
-def link_weather_station_to_map(db, station, map_name):
-    sql = """
-        INSERT INTO simulation_gopr.weather_station_map
-            (station_id, map_name, station_number)
-        VALUES (%s, %s, %s);
-    """
-    db.execute_query(sql, (station["stationId"], map_name, None), fetch=False)
-
-def insert_weather_record(db, station, sim_time, sim_id, reading_id):
-
-    sql = """
-        INSERT INTO simulation_gopr.weather_reading (
-            reading_id, timestamp, wind, fog, temperature, rain, station_id, simulation_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    params = (
+def weather_record_row(station, sim_time, sim_id, reading_id):
+    """Zwraca wiersz tabeli weather_reading dla odczytu ze stacji."""
+    return (
         reading_id,
         sim_time,
         station["wind"],
@@ -218,9 +352,18 @@ def insert_weather_record(db, station, sim_time, sim_id, reading_id):
         station["stationId"],
         sim_id
     )
-    db.execute_query(sql, params, fetch=False)
 
-def bulk_insert_tourist_locations(db, sim_id, tourists_j, location_id_counter):
+def get_location_type(gps_enabled):
+    """Zwraca typ lokalizacji turysty zapisywany w tabeli tourist ("GPS" lub "BTS")."""
+    return "GPS" if gps_enabled else "BTS"
+
+def tourist_location_rows(sim_id, tourists_j, location_id_counter):
+    """
+    Zwraca wiersze tabel location i tourist_location dla lokalizacji turystów.
+
+    Returns:
+        tuple: (wiersze location, wiersze tourist_location).
+    """
     location_records = []
     tourist_loc_records = []
 
@@ -239,72 +382,4 @@ def bulk_insert_tourist_locations(db, sim_id, tourists_j, location_id_counter):
 
         location_id_counter += 1
 
-    db.execute_query("""
-           INSERT INTO simulation_gopr.location
-           (location_id, longitude, latitude)
-           VALUES %s
-       """, location_records, use_execute_values=True)
-
-    db.execute_query("""
-           INSERT INTO simulation_gopr.tourist_location
-           (phone_id, location_id, simulated_timestamp, simulation_id)
-           VALUES %s
-       """, tourist_loc_records, use_execute_values=True)
-
-    return location_id_counter
-
-def insert_route_with_points(db, map_name, route_data):
-    """
-    Wstawia jedną trasę i wszystkie jej punkty (lokacje) do bazy danych jako jedną transakcję.
-    """
-    try:
-
-        db.begin()
-
-        route_id = get_first_index_of(db, "route_id", "route")
-
-        sql_insert_route = """
-            INSERT INTO simulation_gopr.route
-            (route_id, route_number, difficulty, color, is_entrance, area, map_name)
-            VALUES (%s, %s, %s, %s, %s, NULL, %s)
-        """
-        db.execute_query(sql_insert_route, (
-            route_id,
-            route_data["number"],
-            route_data["difficulty"],
-            route_data["color"].lower(),  # DB constraint expects lowercase
-            route_data["isEntrance"],
-            map_name
-        ))
-
-        for point in route_data["points"]:
-            location_id = get_first_index_of_location(db)
-
-            sql_insert_location = """
-                INSERT INTO simulation_gopr.location
-                (location_id, longitude, latitude)
-                VALUES (%s, %s, %s)
-            """
-            db.execute_query(sql_insert_location, (
-                location_id,
-                point["longitude"],
-                point["latitude"]
-            ))
-
-            sql_insert_route_point = """
-                INSERT INTO simulation_gopr.route_point
-                (route_id, location_id, point_number)
-                VALUES (%s, %s, %s)
-            """
-            db.execute_query(sql_insert_route_point, (
-                route_id,
-                location_id,
-                point["point"]
-            ))
-
-        db.commit()
-
-    except Exception as e:
-
-        db.rollback()
-        raise Exception(f"Nie udało się dodać trasy: {e}")
\ No newline at end of file
+    return location_records, tourist_loc_records
@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import threading
+
+import simulation_db
+from history import DEFAULT_MAX_SEGMENT_BYTES, HistoryWriter
+from live_buffer import LiveBufferWriter
+from trajectory_export import TrajectoryExporter
+
+
+class TickRecords:
+    """
+    Wszystko, co symulacja wytworzyła w jednym kroku, trzymane w pamięci.
+
+    Rekordy mają format plików JSON (pogoda jak weather_station.json, zwierzęta jak
+    animal_locations.json, turyści jak tourist_location.json), więc każde ujście
+    korzysta z nich bezpośrednio, bez ponownego wczytywania czegokolwiek z dysku.
+    """
+
+    def __init__(self, sim_time, weather, animals, tourists, spawned=()):
+        self.sim_time = sim_time
+        self.weather = weather
+        self.animals = animals
+        self.tourists = tourists
+        self.spawned = list(spawned)  # (phone_id, gps_enabled) turystów, którzy weszli na mapę w tym kroku
+
+    def as_dict(self):
+        return {
+            "simulated_time": self.sim_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "weather": self.weather,
+            "animals": self.animals,
+            "tourists": self.tourists,
+        }
+
+
+class Sink:
+    """Ujście rekordów kroku. Podklasy implementują write(); close() jest opcjonalne."""
+    name = "sink"
+
+    def write(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonSnapshotSink(Sink):
+    """
+    Bieżący stan w plikach JSON czytanych przez podgląd mapy (nadpisywane co krok).
+
+    Każdy plik jest zapisywany obok jako .tmp i podmieniany przez os.replace, więc
+    czytelnik widzi zawsze cały poprzedni albo cały nowy stan, nigdy plik w połowie zapisany.
+    """
+    name = "json_snapshot"
+    FILES = {
+        "weather": "weather_station.json",
+        "animals": "animal_locations.json",
+        "tourists": "tourist_location.json",
+    }
+
+    def __init__(self, directory=".", indent=None):
+        self.directory = directory
+        self.indent = indent
+
+    def write(self, records):
+        for kind, file_name in self.FILES.items():
+            path = os.path.join(self.directory, file_name)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(getattr(records, kind), f, indent=self.indent)
+            os.replace(tmp_path, path)
+
+
+class DBSink(Sink):
+    """Zapis kroku do bazy: stacje pogodowe, odczyty, lokalizacje zwierząt i turystów, rejestracje turystów."""
+    name = "db"
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    def write(self, records):
+        sim = self.simulation
+        self.write_weather(records)
+
+        # Lokalizacje zwierząt - identyfikatory lokalizacji rezerwujemy jednym blokiem na krok
+        if records.animals:
+            location_id = simulation_db.allocate_location_ids(sim.db, len(records.animals))
+            location_rows = []
+            animal_location_rows = []
+            for loc in records.animals:
+                location_rows.append((location_id, loc["longitude"], loc["latitude"]))
+                animal_location_rows.append((location_id, loc["animal_id"], sim.next_id, loc["simulated_timestamp"]))
+                location_id += 1
+            sim.db_writer.submit({"location": location_rows, "animal_location": animal_location_rows},
+                                 lane="animals")
+
+        # Rejestracja nowych turystów jedną paczką na krok
+        tourist_rows = []
+        simulated_tourist_rows = []
+        for phone_id, gps_enabled in records.spawned:
+            if not sim.references.contains("tourist", phone_id):
+                tourist_rows.append((phone_id, simulation_db.get_location_type(gps_enabled)))
+                sim.references.add("tourist", phone_id)
+            simulated_tourist_rows.append((phone_id, sim.next_id))
+        # Do rejestracji odwołują się lokalizacje z kolejnych kroków, więc nie mogą zostać porzucone
+        sim.db_writer.submit({"tourist": tourist_rows, "simulated_tourist": simulated_tourist_rows},
+                             lane="tourists", droppable=False)
+
+        if records.tourists:
+            loc_id_start = simulation_db.allocate_location_ids(sim.db, len(records.tourists))
+            location_rows, tourist_location_rows = simulation_db.tourist_location_rows(
+                sim.next_id, records.tourists, loc_id_start
+            )
+            sim.db_writer.submit({"location": location_rows, "tourist_location": tourist_location_rows},
+                                 lane="tourists")
+
+    def write_weather(self, records):
+        sim = self.simulation
+        try:
+            curr_reading_id = simulation_db.allocate_ids(sim.db, "reading_id", "weather_reading",
+                                                         len(records.weather))
+            # Stacje detektorów mapy są już powiązane przez import_map - tu tylko nowe stacje. Idą tym samym
+            # torem zapisu co odczyty (przed nimi w TABLE_ORDER), więc odczyt nigdy nie wyprzedza swojej stacji
+            new_stations = [station for station in records.weather
+                            if not sim.references.contains("weather_station", station["stationId"])]
+            if new_stations:
+                location_id = simulation_db.allocate_location_ids(sim.db, len(new_stations))
+                registration = {"location": [], "weather_station": [], "weather_station_map": []}
+                for offset, station in enumerate(new_stations):
+                    rows = simulation_db.weather_station_rows(station, sim.map_name, location_id + offset)
+                    for table, row in zip(registration, rows):
+                        registration[table].append(row)
+                    sim.references.add("weather_station", station["stationId"])
+                sim.db_writer.submit(registration, lane="weather", droppable=False)
+
+            weather_rows = []
+            for station in records.weather:
+                weather_rows.append(simulation_db.weather_record_row(
+                    station, records.sim_time, sim.next_id, curr_reading_id
+                ))
+                curr_reading_id += 1
+            sim.db_writer.submit({"weather_reading": weather_rows}, lane="weather")
+        except Exception as e:
+            print(f"[BŁĄD POGODY] {e}")
+
+
+class HistorySink(Sink):
+    """Historia przebiegu: jeden wiersz NDJSON na krok w segmentach z indeksem czasu (history.HistoryWriter)."""
+    name = "history"
+
+    def __init__(self, file_path="simulation_history.ndjson", max_segment_bytes=DEFAULT_MAX_SEGMENT_BYTES):
+        self.writer = HistoryWriter(file_path, max_segment_bytes)
+
+    def write(self, records):
+        self.writer.append(records.sim_time, records.as_dict())
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnarSink(Sink):
+    """Kolumnowy eksport trajektorii zwierząt i turystów (trajectory_export.TrajectoryExporter)."""
+    name = "columnar"
+
+    def __init__(self, directory="trajectories", row_group_ticks=60, file_format=None):
+        self.exporter = TrajectoryExporter(directory, row_group_ticks, file_format)
+
+    def write(self, records):
+        self.exporter.add_tick(records.sim_time, records.animals, records.tourists)
+
+    def close(self):
+        self.exporter.close()
+
+
+class LiveBufferSink(Sink):
+    """Pozycje aktorów w buforze mapowanym w pamięci dla lokalnych czytelników (live_buffer.LiveBufferWriter)."""
+    name = "live_buffer"
+
+    def __init__(self, path="live_positions.bin", slots=4, capacity=4096):
+        self.writer = LiveBufferWriter(path, slots, capacity)
+
+    def write(self, records):
+        self.writer.publish(records.sim_time, records.animals, records.tourists)
+
+    def close(self):
+        self.writer.close()
+
+
+class DisplaySink(Sink):
+    """
+    Strumień dla podglądu na żywo: ostatni stan kroku (już jako JSON) i kolejki subskrybentów.
+
+    Subskrybent, który nie nadąża, dostaje tylko najnowszy stan - starsze są pomijane.
+    """
+    name = "display"
+
+    def __init__(self):
+        self.latest = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Zwraca kolejkę, do której trafia JSON każdego kolejnego kroku."""
+        subscriber = queue.Queue(maxsize=1)
+        with self.lock:
+            self.subscribers.append(subscriber)
+            if self.latest is not None:
+                subscriber.put_nowait(self.latest)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def write(self, records):
+        payload = json.dumps(records.as_dict())
+        with self.lock:
+            self.latest = payload
+            for subscriber in self.subscribers:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(payload)
+
+
+class OutputPipeline:
+    """Rozsyła rekordy każdego kroku do włączonych ujść; błąd jednego ujścia nie blokuje pozostałych."""
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def get(self, name):
+        """Zwraca włączone ujście o podanej nazwie lub None."""
+        return next((sink for sink in self.sinks if sink.name == name), None)
+
+    def emit(self, records):
+        for sink in self.sinks:
+            try:
+                sink.write(records)
+            except Exception as e:
+                print(f"[BŁĄD WYJŚCIA] {sink.name}: {e}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
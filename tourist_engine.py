@@ -0,0 +1,339 @@
+import math
+
+import numpy as np
+
+MAX_CROSSINGS_PER_TICK = 100  # Ograniczenie przejść między szlakami w jednym kroku (jak w simulation.py)
+
+
+class VectorTouristEngine:
+    """
+    Silnik turystów w układzie "struktura tablic".
+
+    Stan wszystkich turystów (pozycja, trasa, odległość wzdłuż trasy, odcinek, kierunek,
+    prędkość, flagi ruchu i zgubienia) trzymany jest w tablicach NumPy, a cała populacja
+    przesuwana jest jednym zwektoryzowanym krokiem. Prawdopodobieństwa zdarzeń są
+    takie same jak w klasie tourists.Tourist i ActorsLocationSimulator.
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, route_graph, special_places, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self._pack_routes(route_graph)
+        self._pack_special_places(special_places)
+
+        self.n = 0
+        self.capacity = 0
+        self.phone_ids = np.empty(0, dtype=object)
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.route = np.empty(0, dtype=np.int32)
+        self.distance = np.empty(0)
+        self.point = np.empty(0, dtype=np.int32)
+        self.direction = np.empty(0, dtype=np.int8)
+        self.base_speed = np.empty(0)
+        self.speed = np.empty(0)
+        self.moving = np.empty(0, dtype=bool)
+        self.lost = np.empty(0, dtype=bool)
+        self.out_of_route = np.empty(0, dtype=bool)
+        self.gps_enabled = np.empty(0, dtype=bool)
+        self.weather_label = np.empty(0, dtype=np.int8)
+        self._grow(self.INITIAL_CAPACITY)
+
+        self.exited = 0
+
+    def __len__(self):
+        return self.n
+
+    def _pack_routes(self, route_graph):
+        """Spłaszcza punkty i długości wszystkich tras grafu do wspólnych tablic."""
+        routes = list(route_graph.routes.values())
+        self.route_graph = route_graph
+        self.route_numbers = np.array([r.number for r in routes], dtype=np.int64)
+        self.route_index = {r.number: i for i, r in enumerate(routes)}
+        self.route_len = np.array([len(r.points) for r in routes], dtype=np.int32)
+        self.route_offset = np.zeros(len(routes), dtype=np.int64)
+        if len(routes) > 1:
+            self.route_offset[1:] = np.cumsum(self.route_len)[:-1]
+        self.route_is_entrance = np.array([r.is_entrance for r in routes], dtype=bool)
+        self.route_length = np.array([r.length for r in routes], dtype=float)
+        self.points_x = np.array([x for r in routes for x in r.xs], dtype=float)
+        self.points_y = np.array([y for r in routes for y in r.ys], dtype=float)
+        # Parametryzacja długością łuku: skumulowana odległość każdego punktu od początku jego trasy
+        self.points_s = np.array([d for r in routes for d in r.cumulative], dtype=float)
+
+        # Przejścia z grafu skrzyżowań dla każdego końca trasy (klucz: 2 * trasa + koniec,
+        # 0 = początek, 1 = koniec) w formacie CSR: cand_ptr[k]:cand_ptr[k + 1] wskazuje wiersze tablic cand_*.
+        cand_ptr = [0]
+        cand_route, cand_point, cand_dir = [], [], []
+        for r in routes:
+            for at_end in (False, True):
+                for transition in route_graph.get_transitions(r.number, at_end):
+                    cand_route.append(self.route_index[transition["route_number"]])
+                    cand_point.append(transition["point_index"])
+                    cand_dir.append(transition["direction"])
+                cand_ptr.append(len(cand_route))
+        self.cand_ptr = np.array(cand_ptr, dtype=np.int64)
+        self.cand_route = np.array(cand_route, dtype=np.int32)
+        self.cand_point = np.array(cand_point, dtype=np.int32)
+        self.cand_dir = np.array(cand_dir, dtype=np.int8)
+        self.cand_distance = self.points_s[self.route_offset[self.cand_route] + self.cand_point]
+
+    def set_route_graph(self, route_graph):
+        """
+        Podmienia graf tras (np. po edycji mapy), przenosząc turystów na trasy o tych samych numerach.
+        Turyści z tras, których już nie ma, są usuwani z mapy.
+        """
+        old_numbers = self.route_numbers[self.route[:self.n]]
+        self._pack_routes(route_graph)
+        new_route = np.array([self.route_index.get(int(number), -1) for number in old_numbers], dtype=np.int32)
+        self.route[:self.n] = np.maximum(new_route, 0)
+        if self.n:
+            last = np.maximum(self.route_len[self.route[:self.n]] - 2, 0)
+            self.point[:self.n] = np.minimum(self.point[:self.n], last)
+            self.distance[:self.n] = np.minimum(self.distance[:self.n], self.route_length[self.route[:self.n]])
+        missing = np.flatnonzero(new_route < 0)
+        if len(missing):
+            print(f"Usunięto {len(missing)} turystów z tras, których nie ma już na mapie.")
+            self._remove(missing)
+
+    def _pack_special_places(self, special_places):
+        self.place_x = np.array([p["coordinates"]["longitude"] for p in special_places], dtype=float)
+        self.place_y = np.array([p["coordinates"]["latitude"] for p in special_places], dtype=float)
+        self.place_r = np.array([p["radius"] for p in special_places], dtype=float)
+
+    _STATE = ("phone_ids", "x", "y", "route", "distance", "point", "direction", "base_speed", "speed",
+              "moving", "lost", "out_of_route", "gps_enabled", "weather_label")
+
+    def _grow(self, capacity):
+        for name in self._STATE:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def spawn(self, phone_id, route_number):
+        """
+        Dodaje turystę na pierwszym punkcie trasy wejściowej.
+
+        Returns:
+            bool: Czy turysta ma włączony GPS (potrzebne przy zapisie do bazy).
+        """
+        if self.n == self.capacity:
+            self._grow(self.capacity * 2)
+        r = self.route_index[route_number]
+        i = self.n
+        start = self.route_offset[r]
+        self.phone_ids[i] = phone_id
+        self.x[i] = self.points_x[start]
+        self.y[i] = self.points_y[start]
+        self.route[i] = r
+        self.distance[i] = 0.0
+        self.point[i] = 0
+        self.direction[i] = 1
+        self.base_speed[i] = self.rng.uniform(0.5, 2.0)
+        self.speed[i] = self.base_speed[i]
+        self.moving[i] = True
+        self.lost[i] = False
+        self.out_of_route[i] = False
+        self.gps_enabled[i] = self.rng.random() < 0.5
+        self.weather_label[i] = self.rng.integers(1, 5)
+        self.n += 1
+        return bool(self.gps_enabled[i])
+
+    def step(self, delta):
+        """
+        Przesuwa całą populację o jeden krok czasu.
+
+        Returns:
+            int: Liczba turystów, którzy w tym kroku opuścili mapę.
+        """
+        n = self.n
+        if n == 0:
+            return 0
+        rng = self.rng
+        x, y = self.x[:n], self.y[:n]
+        route, point, direction = self.route[:n], self.point[:n], self.direction[:n]
+        speed, moving, lost = self.speed[:n], self.moving[:n], self.lost[:n]
+
+        # Miejsca specjalne: 1/10 szansy na zatrzymanie i 1/10 na ponowne ruszenie
+        if len(self.place_r):
+            dx = x[:, None] - self.place_x[None, :]
+            dy = y[:, None] - self.place_y[None, :]
+            in_place = ((dx ** 2 + dy ** 2) <= self.place_r[None, :] ** 2).any(axis=1)
+            moving[in_place & moving & (rng.random(n) < 0.1)] = False
+            moving[in_place & ~moving & (rng.random(n) < 0.1)] = True
+
+        active = moving.copy()
+
+        # Kontuzja: 1/1000 szansy, po niej 1/10 szansy na natychmiastowe ruszenie
+        injured = active & (rng.random(n) < 0.001)
+        moving[injured] = False
+        moving[injured & (rng.random(n) < 0.1)] = True
+
+        # Zgubienie drogi (1/500) i jej odnalezienie (1/100)
+        u = rng.random(n)
+        found = active & lost & (u < 0.01)
+        got_lost = active & ~lost & (u < 0.002)
+        lost[found] = False
+        lost[got_lost] = True
+
+        wandering = active & lost
+        on_route = active & ~lost
+
+        # Zmiana prędkości (10% szansy) dla wszystkich, którzy się przemieszczają
+        change = active & (rng.random(n) < 0.1)
+        if change.any():
+            varied = self.base_speed[:n][change] + rng.uniform(-0.1, 0.1, change.sum())
+            speed[change] = np.clip(varied, 0.5, 2.0)
+
+        # Zgubieni poruszają się w losowym kierunku i schodzą z trasy
+        idx = np.flatnonzero(wandering)
+        if len(idx):
+            angle = rng.uniform(0, 2 * math.pi, len(idx))
+            distance = delta * speed[idx]
+            x[idx] += distance * np.cos(angle)
+            y[idx] += distance * np.sin(angle)
+            self.out_of_route[idx] = True
+
+        idx = np.flatnonzero(on_route)
+        remaining = delta * speed[idx]
+
+        # Ci, którzy odnaleźli drogę, wracają do miejsca na trasie, w którym ją zgubili
+        back = self.out_of_route[idx]
+        if back.any():
+            b = idx[back]
+            tx, ty = self._route_positions(b)
+            dx, dy = tx - x[b], ty - y[b]
+            total = np.hypot(dx, dy)
+            reached = total <= remaining[back]
+            ratio = np.divide(remaining[back], total, out=np.ones_like(total), where=~reached)
+            x[b] = np.where(reached, tx, x[b] + dx * ratio)
+            y[b] = np.where(reached, ty, y[b] + dy * ratio)
+            self.out_of_route[b[reached]] = False
+            remaining[back] = np.where(reached, remaining[back] - total, 0.0)
+
+        # Ruch wzdłuż trasy - nadmiar dystansu przechodzi przez kolejne punkty i skrzyżowania
+        walking = remaining > 0
+        walkers, remaining = idx[walking], remaining[walking]
+        exiting = []
+        for _ in range(MAX_CROSSINGS_PER_TICK):
+            if not len(walkers):
+                break
+            forward = self.direction[walkers] == 1
+            length = self.route_length[self.route[walkers]]
+            s = self.distance[walkers]
+            to_end = np.where(forward, length - s, s)
+            inside = remaining < to_end
+            self.distance[walkers[inside]] = s[inside] + self.direction[walkers[inside]] * remaining[inside]
+
+            ends = walkers[~inside]
+            self.distance[ends] = np.where(forward[~inside], length[~inside], 0.0)
+            remaining = remaining[~inside] - to_end[~inside]
+            left = self._manage_crossings(ends)
+            exiting.append(ends[left])
+            walkers, remaining = ends[~left], remaining[~left]
+            walking = remaining > 0
+            walkers, remaining = walkers[walking], remaining[walking]
+
+        placed = np.flatnonzero(on_route & ~self.out_of_route[:n])
+        x[placed], y[placed] = self._route_positions(placed)
+
+        exiting = np.concatenate(exiting) if exiting else np.empty(0, dtype=np.int64)
+        if len(exiting):
+            self._remove(exiting)
+        return len(exiting)
+
+    def _route_positions(self, idx):
+        """
+        Wyznacza współrzędne turystów z ich odległości wzdłuż trasy.
+
+        Kursor odcinka (tablica point) przesuwany jest od poprzedniej pozycji, więc koszt
+        jest proporcjonalny do liczby minionych punktów trasy (zamortyzowane O(1)).
+        """
+        route = self.route[idx]
+        s = self.distance[idx]
+        offset = self.route_offset[route]
+        last = np.maximum(self.route_len[route] - 2, 0)
+        cursor = np.minimum(self.point[idx], last)
+
+        pending = np.arange(len(idx))
+        while len(pending):
+            f = offset[pending] + cursor[pending]
+            forward = (cursor[pending] < last[pending]) & (self.points_s[np.minimum(f + 1, len(self.points_s) - 1)] < s[pending])
+            backward = ~forward & (cursor[pending] > 0) & (self.points_s[f] > s[pending])
+            cursor[pending] += forward.astype(cursor.dtype) - backward.astype(cursor.dtype)
+            pending = pending[forward | backward]
+        self.point[idx] = cursor
+
+        f = offset + cursor
+        g = offset + np.minimum(cursor + 1, self.route_len[route] - 1)
+        span = self.points_s[g] - self.points_s[f]
+        ratio = np.divide(s - self.points_s[f], span, out=np.zeros_like(span), where=span > 0)
+        ratio = np.clip(ratio, 0.0, 1.0)
+        return (self.points_x[f] + (self.points_x[g] - self.points_x[f]) * ratio,
+                self.points_y[f] + (self.points_y[g] - self.points_y[f]) * ratio)
+
+    def _manage_crossings(self, idx):
+        """
+        Obsługuje turystów, którzy doszli do końca trasy: przejście na pobliski szlak,
+        zawrócenie albo wyjście z mapy.
+
+        Returns:
+            np.ndarray: Maska (względem idx) turystów, którzy opuszczają mapę.
+        """
+        route = self.route[idx]
+        at_end = self.direction[idx] == 1
+
+        # Wyjście z mapy tylko na początku tras wejściowych
+        exiting = ~at_end & self.route_is_entrance[route]
+        staying = ~exiting
+        idx, route, at_end = idx[staying], route[staying], at_end[staying]
+
+        key = 2 * route + at_end
+        count = self.cand_ptr[key + 1] - self.cand_ptr[key]
+        has = count > 0
+
+        # Brak pobliskich szlaków - turysta zawraca
+        self.direction[idx[~has]] = np.where(at_end[~has], -1, 1)
+
+        # Wybór losowego szlaku spośród pobliskich
+        chosen = idx[has]
+        if len(chosen):
+            c = self.cand_ptr[key[has]] + (self.rng.random(len(chosen)) * count[has]).astype(np.int64)
+            new_route = self.cand_route[c]
+            self.route[chosen] = new_route
+            self.distance[chosen] = self.cand_distance[c]
+            self.point[chosen] = np.minimum(self.cand_point[c], np.maximum(self.route_len[new_route] - 2, 0))
+            self.direction[chosen] = self.cand_dir[c]
+
+        return exiting
+
+    def _remove(self, idx):
+        """Usuwa turystów o podanych indeksach, zagęszczając tablice."""
+        keep = np.ones(self.n, dtype=bool)
+        keep[idx] = False
+        remaining = int(keep.sum())
+        for name in self._STATE:
+            arr = getattr(self, name)
+            arr[:remaining] = arr[:self.n][keep]
+        self.n = remaining
+        self.exited += len(idx)
+
+    def create_locations(self, timestamp):
+        """Zwraca lokalizacje wszystkich turystów w formacie Tourist.create_location."""
+        n = self.n
+        return [
+            {
+                "title": "touristLocation",
+                "PhoneId": phone_id,
+                "locType": "GPS" if gps else "BTS",
+                "timeStamp": timestamp,
+                "location": {
+                    "longitude": str(lon),
+                    "latitude": str(lat)
+                }
+            }
+            for phone_id, gps, lon, lat in zip(self.phone_ids[:n], self.gps_enabled[:n].tolist(),
+                                                self.x[:n].tolist(), self.y[:n].tolist())
+        ]
@@ -12,7 +12,8 @@ class Tourist:
         self.phone_id = phone_id
         self.start_route_number = route_number  # Numer początkowej trasy
         self.current_route_number = route_number  # Aktualna trasa
-        self.current_point_index = 0  # Indeks aktualnego punktu na trasie
+        self.current_point_index = 0  # Indeks aktualnego odcinka (punktu początkowego) na trasie
+        self.distance = 0.0  # Odległość przebyta wzdłuż aktualnej trasy
         self.direction = 1  # 1: w przód, -1: w tył
         self.last_location = [0, 0]  # [longitude, latitude]
         self.is_moving = True  # Czy turysta się porusza
@@ -57,6 +58,9 @@ class Tourist:
         self.current_route_number = route_number
         self.current_point_index = point_index
 
+    def set_distance(self, distance):
+        self.distance = distance
+
     def set_moving(self, is_moving):
         self.is_moving = is_moving
 
@@ -120,23 +124,3 @@ class Tourist:
         if not self.is_moving and random.randint(1, 10) == 1:
             self.is_moving = True
             print(f"Tourist {self.phone_id} started moving again.")
-
-    def insert_tourist_into_database(self,sim_id,simdb):
-        if self.gps_enabled:
-            loctype="GPS"
-        else:
-            loctype="BTS"
-
-        upsert_tourist_sql = """
-                                    INSERT INTO simulation_gopr.tourist(phone_id, location_type)
-                                    VALUES (%s, %s)
-                                    ON CONFLICT (phone_id) DO NOTHING;
-                                """
-        simdb.execute_query(upsert_tourist_sql, (self.phone_id, loctype), fetch=False)
-
-        insert_sim_tourist_sql = """
-                                    INSERT INTO simulation_gopr.simulated_tourist(phone_id, simulation_id)
-                                    VALUES (%s, %s);
-                                """
-
-        simdb.execute_query(insert_sim_tourist_sql, (self.phone_id,sim_id), fetch=False)
\ No newline at end of file
@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # bez pyarrow eksport zapisuje grupy wierszy jako .npz
+    pa = None
+    pq = None
+
+EPOCH = datetime(1970, 1, 1)
+ACTOR_KINDS = ("tourist", "animal")
+ACTORS_FILE = "actors.json"
+# Kolumny grupy wierszy i ich typy
+COLUMNS = {
+    "timestamp_us": np.int64,  # czas symulacji w mikrosekundach od 1970-01-01
+    "actor": np.int32,  # indeks w słowniku identyfikatorów aktorów (actors.json)
+    "kind": np.int8,  # indeks w ACTOR_KINDS
+    "gps": np.bool_,  # typ lokalizacji turysty (GPS/BTS); dla zwierząt zawsze False
+    "longitude": np.float64,
+    "latitude": np.float64,
+}
+
+
+def to_epoch_us(sim_time):
+    """Zamienia czas symulacji (datetime) na liczbę mikrosekund od 1970-01-01."""
+    return (sim_time - EPOCH) // timedelta(microseconds=1)
+
+
+class TrajectoryExporter:
+    """
+    Kolumnowy eksport trajektorii: float64 współrzędne, int64 znaczniki czasu i aktorzy
+    zakodowani słownikowo, zapisywane w grupach wierszy co row_group_ticks kroków.
+
+    Każda grupa to osobny plik part-00000.parquet (jeśli dostępny jest pyarrow) lub
+    part-00000.npz, a słownik identyfikatorów aktorów trafia do actors.json.
+    Całość wczytuje load_trajectories().
+    """
+
+    def __init__(self, directory="trajectories", row_group_ticks=60, file_format=None):
+        """
+        Args:
+            directory (str): Katalog eksportu (tworzony, jeśli nie istnieje; stare części są usuwane).
+            row_group_ticks (int): Liczba kroków symulacji w jednej grupie wierszy.
+            file_format (str, opcjonalnie): "parquet" lub "npz"; domyślnie parquet, gdy jest pyarrow.
+        """
+        self.directory = directory
+        self.row_group_ticks = max(int(row_group_ticks), 1)
+        self.file_format = file_format or ("parquet" if pq else "npz")
+        if self.file_format == "parquet" and pq is None:
+            raise ValueError("Eksport do Parquet wymaga pakietu pyarrow")
+
+        os.makedirs(directory, exist_ok=True)
+        for old_part in glob.glob(os.path.join(directory, "part-*")):
+            os.remove(old_part)
+
+        self.actor_ids = []
+        self.actor_index = {}
+        self.parts = 0
+        self.ticks = 0
+        self.chunks = {name: [] for name in COLUMNS}
+
+    def _encode_actors(self, actor_ids):
+        codes = np.empty(len(actor_ids), dtype=np.int32)
+        for i, actor_id in enumerate(actor_ids):
+            code = self.actor_index.get(actor_id)
+            if code is None:
+                code = self.actor_index[actor_id] = len(self.actor_ids)
+                self.actor_ids.append(actor_id)
+            codes[i] = code
+        return codes
+
+    def add_tick(self, sim_time, animals, tourists):
+        """Dopisuje lokalizacje zwierząt i turystów z jednego kroku (formaty z TickRecords)."""
+        n_animals, n_tourists = len(animals), len(tourists)
+        n = n_animals + n_tourists
+        if n:
+            chunk = {
+                "timestamp_us": np.full(n, to_epoch_us(sim_time), dtype=np.int64),
+                "actor": self._encode_actors(
+                    [loc["animal_id"] for loc in animals] + [loc["PhoneId"] for loc in tourists]
+                ),
+                "kind": np.repeat(np.array([1, 0], dtype=np.int8), [n_animals, n_tourists]),
+                "gps": np.array([False] * n_animals + [loc["locType"] == "GPS" for loc in tourists], dtype=bool),
+                "longitude": np.array([loc["longitude"] for loc in animals]
+                                      + [loc["location"]["longitude"] for loc in tourists], dtype=np.float64),
+                "latitude": np.array([loc["latitude"] for loc in animals]
+                                     + [loc["location"]["latitude"] for loc in tourists], dtype=np.float64),
+            }
+            for name, values in chunk.items():
+                self.chunks[name].append(values)
+
+        self.ticks += 1
+        if self.ticks >= self.row_group_ticks:
+            self.flush()
+
+    def flush(self):
+        """Zapisuje zebrane kroki jako kolejną grupę wierszy."""
+        self.ticks = 0
+        if not self.chunks["timestamp_us"]:
+            return
+        columns = {name: np.concatenate(chunks).astype(COLUMNS[name], copy=False)
+                   for name, chunks in self.chunks.items()}
+        self.chunks = {name: [] for name in COLUMNS}
+
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.{self.file_format}")
+        if self.file_format == "parquet":
+            pq.write_table(pa.table(columns), path)
+        else:
+            np.savez(path, **columns)
+        self.parts += 1
+
+        # Słownik aktorów tylko rośnie, więc zapisany po każdej grupie pasuje do wszystkich dotychczasowych części
+        with open(os.path.join(self.directory, ACTORS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"kinds": ACTOR_KINDS, "actors": self.actor_ids}, f)
+
+    def close(self):
+        self.flush()
+
+
+def load_trajectories(directory="trajectories", as_dataframe=False):
+    """
+    Wczytuje eksport TrajectoryExporter.
+
+    Args:
+        directory (str): Katalog eksportu.
+        as_dataframe (bool): Zwróć pandas.DataFrame (z kolumną actor_id jako Categorical) zamiast słownika.
+
+    Returns:
+        dict: Kolumny z COLUMNS jako tablice NumPy oraz "actor_ids" (słownik: kod -> identyfikator aktora),
+        albo pandas.DataFrame, jeśli as_dataframe=True.
+    """
+    with open(os.path.join(directory, ACTORS_FILE), "r", encoding="utf-8") as f:
+        actors = json.load(f)
+
+    parts = {name: [] for name in COLUMNS}
+    for path in sorted(glob.glob(os.path.join(directory, "part-*"))):
+        if path.endswith(".parquet"):
+            table = pq.read_table(path)
+            for name in COLUMNS:
+                parts[name].append(table.column(name).to_numpy())
+        else:
+            with np.load(path) as part:
+                for name in COLUMNS:
+                    parts[name].append(part[name])
+
+    columns = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=COLUMNS[name])
+               for name, chunks in parts.items()}
+    columns["actor_ids"] = np.array(actors["actors"], dtype=object)
+
+    if not as_dataframe:
+        return columns
+
+    import pandas as pd
+    actor_ids = columns.pop("actor_ids")
+    frame = pd.DataFrame(columns)
+    frame["actor_id"] = pd.Categorical.from_codes(frame.pop("actor"), categories=actor_ids)
+    frame["kind"] = pd.Categorical.from_codes(frame["kind"], categories=list(actors["kinds"]))
+    frame["timestamp"] = pd.to_datetime(frame.pop("timestamp_us"), unit="us")
+    return frame
@@ -1,8 +1,13 @@
+import bisect
 import json
 import os
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
+
+WEATHER_FIELDS = ("temperature", "wind", "fog", "rain")
+
 def load_weather_events(file_path="weather_events.json"):
     """Ładowanie zdarzeń pogodowych z pliku JSON."""
     if not os.path.exists(file_path):
@@ -87,8 +92,8 @@ def get_timestamp_for_minute(minute):
     target_time = base_date + timedelta(minutes=minute)
     return target_time.strftime("%Y-%m-%d %H:%M:%S.%f")
 
-def save_weather_station_to_file(weather_station, file_path="weather_station.json"):
-    """Zapisuje dane pogodowe do pliku JSON w wymaganym formacie."""
+def format_weather_station(weather_station):
+    """Zwraca dane pogodowe w formacie pliku weather_station.json."""
     formatted_data = []
     for item in weather_station:
         formatted_item = {
@@ -105,29 +110,173 @@ def save_weather_station_to_file(weather_station, file_path="weather_station.jso
             "rain": str(item["weather"]["rain"])                    # Konwersja na string
         }
         formatted_data.append(formatted_item)
+    return formatted_data
+
+class WeatherTimeline:
+    """
+    Zdarzenia pogodowe wczytane raz i pogrupowane w posortowane osie czasu dla każdego detektora.
+
+    Plik ze zdarzeniami jest ponownie wczytywany tylko wtedy, gdy zmieni się jego czas
+    modyfikacji (np. po dodaniu zdarzenia w GUI). Zdarzenia otaczające daną minutę
+    wyszukiwane są binarnie.
+    """
+
+    def __init__(self, file_path="weather_events.json"):
+        self.file_path = file_path
+        self.signature = None
+        self.detectors = {}  # detectorNumber -> współrzędne (kolejność jak w get_weather_by_minute)
+        self.events = {}  # str(detectorNumber) -> zdarzenia posortowane po minucie
+        self.minutes = {}  # str(detectorNumber) -> minuty tych zdarzeń
+        self.refresh()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Wczytuje zdarzenia ponownie, jeśli plik zmienił się od ostatniego odczytu."""
+        signature = self._file_signature()
+        if signature == self.signature and self.signature is not None:
+            return
+        self.signature = signature
+        all_events = load_weather_events(self.file_path)
+
+        self.detectors = {}
+        self.events = {}
+        for e in all_events:
+            for d in e["detectors"]:
+                self.detectors[d["detectorNumber"]] = d["coordinates"]
+            for key in {str(d["detectorNumber"]) for d in e["detectors"]}:
+                self.events.setdefault(key, []).append(e)
+        self.minutes = {key: [e["minute"] for e in events] for key, events in self.events.items()}
+
+    def get_weather_for_detector(self, minute, detector_number):
+        """Zwraca dane pogodowe dla detektora w danej minucie (jak get_weather_for_detector)."""
+        key = str(detector_number)
+        relevant_events = self.events.get(key)
+        if not relevant_events:
+            return get_weather_for_detector(minute, detector_number, [])
+
+        i = bisect.bisect_right(self.minutes[key], minute)
+        earlier = relevant_events[i - 1] if i > 0 else None
+        later = relevant_events[i] if i < len(relevant_events) else None
+
+        if earlier and later:
+            return smooth_weather_transition(earlier, later, minute)
+        e = earlier or later
+        return {
+            "temperature": apply_variation(e["temperature"], 3),
+            "wind": apply_variation(e["wind"], 10),
+            "fog": apply_variation(e["fog"], 10),
+            "rain": apply_variation(e["rain"], 10),
+        }
+
+    def get_weather_by_minute(self, minute):
+        """Pobiera dane pogodowe dla wszystkich detektorów na danej minucie."""
+        self.refresh()
+        return [
+            {
+                "detectorNumber": detector_number,
+                "coordinates": coordinates,
+                "weather": self.get_weather_for_detector(minute, detector_number),
+                "minute": minute
+            }
+            for detector_number, coordinates in self.detectors.items()
+        ]
+
+
+class WeatherTensor:
+    """
+    Pogoda dla całego przebiegu policzona z góry jako tablica minuty x detektory x
+    (temperatura, wiatr, mgła, deszcz).
+
+    Interpolacja i losowe fluktuacje odpowiadają smooth_weather_transition oraz
+    WeatherTimeline.get_weather_for_detector, więc krok symulacji sprowadza się do
+    odczytu jednego wiersza. Zmiany w pliku zdarzeń po wyliczeniu nie są uwzględniane.
+    """
+
+    def __init__(self, detectors, weather):
+        self.detectors = detectors  # lista (detectorNumber, współrzędne)
+        self.weather = weather
+
+    @classmethod
+    def precompute(cls, timeline, num_minutes, rng=None):
+        """
+        Wylicza pogodę dla minut 0..num_minutes-1 wszystkich detektorów osi czasu.
+
+        Args:
+            timeline (WeatherTimeline): Zdarzenia pogodowe.
+            num_minutes (int): Liczba minut symulacji.
+            rng (np.random.Generator, opcjonalnie): Generator fluktuacji (dla powtarzalności).
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        timeline.refresh()
+        detectors = list(timeline.detectors.items())
+        minutes = np.arange(num_minutes)
+        weather = np.empty((num_minutes, len(detectors), len(WEATHER_FIELDS)))
+        # Fluktuacja w procentach dla odczytu z jednego zdarzenia (bez interpolacji)
+        single_variation = np.array([3.0, 10.0, 10.0, 10.0])
+
+        for column, (detector_number, _) in enumerate(detectors):
+            # timeline.detectors zawiera tylko detektory, które mają co najmniej jedno zdarzenie
+            events = timeline.events[str(detector_number)]
+            event_minutes = np.array(timeline.minutes[str(detector_number)], dtype=float)
+            values = np.array([[e[field] for field in WEATHER_FIELDS] for e in events], dtype=float)
+            i = np.searchsorted(event_minutes, minutes, side="right")
+            has_earlier = i > 0
+            has_later = i < len(events)
+            e1 = np.clip(i - 1, 0, len(events) - 1)
+            e2 = np.clip(i, 0, len(events) - 1)
+
+            # Interpolacja między zdarzeniami (jak smooth_weather_transition)
+            span = event_minutes[e2] - event_minutes[e1]
+            ratio = np.divide(minutes - event_minutes[e1], span, out=np.ones(num_minutes), where=span != 0)
+            interpolated = values[e1] + (values[e2] - values[e1]) * ratio[:, None]
+
+            both = has_earlier & has_later
+            column_values = np.where(both[:, None], interpolated, np.where(has_earlier[:, None], values[e1], values[e2]))
+            variation = np.where(both[:, None], 3.0, single_variation[None, :])
+            weather[:, column] = column_values + column_values * variation / 100.0 * rng.uniform(-1.0, 1.0, column_values.shape)
+
+        return cls(detectors, np.round(weather, 2))
+
+    def get_weather_by_minute(self, minute):
+        """Zwraca dane pogodowe wszystkich detektorów w formacie get_weather_by_minute."""
+        row = self.weather[min(max(minute, 0), len(self.weather) - 1)].tolist()
+        return [
+            {
+                "detectorNumber": detector_number,
+                "coordinates": coordinates,
+                "weather": dict(zip(WEATHER_FIELDS, values)),
+                "minute": minute
+            }
+            for (detector_number, coordinates), values in zip(self.detectors, row)
+        ]
+
+    def export(self, file_path):
+        """Zapisuje całą tablicę pogody do pliku .npz (do analizy)."""
+        np.savez_compressed(
+            file_path,
+            weather=self.weather,
+            minutes=np.arange(len(self.weather)),
+            detectors=np.array([str(number) for number, _ in self.detectors]),
+            fields=np.array(WEATHER_FIELDS)
+        )
+
+
+_timelines = {}
+
+
+def get_weather_timeline(file_path="weather_events.json"):
+    """Zwraca współdzieloną oś czasu zdarzeń pogodowych dla danego pliku."""
+    if file_path not in _timelines:
+        _timelines[file_path] = WeatherTimeline(file_path)
+    return _timelines[file_path]
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(formatted_data, f, indent=4)
 
 def get_weather_by_minute(minute, file_path="weather_events.json"):
     """Pobiera dane pogodowe dla wszystkich detektorów na danej minucie."""
-    all_events = load_weather_events(file_path)
-    future_events = [e for e in all_events if e["minute"] >= minute]
-    save_weather_events(all_events, file_path)
-
-    unique_detectors = {}
-    for e in all_events:
-        for d in e["detectors"]:
-            unique_detectors[d["detectorNumber"]] = d["coordinates"]
-
-    result = []
-    for detector_number, coordinates in unique_detectors.items():
-        weather = get_weather_for_detector(minute, detector_number, all_events)
-        result.append({
-            "detectorNumber": detector_number,
-            "coordinates": coordinates,
-            "weather": weather,
-            "minute": minute  # Dodajemy minutę do wyniku, aby użyć w save_weather_station_to_file
-        })
-
-    return result
\ No newline at end of file
+    return get_weather_timeline(file_path).get_weather_by_minute(minute)
@@ -1,14 +1,15 @@
-# Aby uruchomić wyświetlacz trzeba w cmd w lokalizacji projektu (czyli folder GOPR_symulator)
-# wykonać poniższą komendę
+# Wyświetlacz mapy na żywo. Mapę udostępnia sama symulacja (live_server.LiveServer) -
+# wystarczy w config.json dodać ujście "display":
 #
-# python -m http.server 8000
+# "output_sinks": ["json_snapshot", "display"]
 #
-# Następnie uruchomić ten plik
-# Od tej chwili mapa dostępna jest pod linkiem:
+# (opcjonalnie "live_server_port", domyślnie 8000), wygenerować map.html tym plikiem
+# i uruchomić symulację. Od tej chwili mapa dostępna jest pod linkiem:
 #
 # http://localhost:8000/map.html
 #
-# Na ten moment aktualizuje się co 10 sekund później dostosuje się to do prędkości generowania
+# Stan każdego kroku jest wypychany do przeglądarki przez Server-Sent Events (/events);
+# przeglądarki bez EventSource odpytują co sekundę /state.
 import json
 
 # Wczytaj dane z pliku map_sample.json
@@ -16,7 +17,7 @@ with open("map_sample.json", "r") as file:
     static_data = json.load(file)
 
 # Ścieżka do obrazka mapy
-map_file = "krakow.png"
+map_file = "Krakow.png"
 
 # HTML - szkielet pliku
 html_template = f"""
@@ -34,6 +35,7 @@ html_template = f"""
 </head>
 <body>
     <h1>Mapa tras i lokalizacji zwierząt</h1>
+    <p>Czas symulacji: <span id="simulatedTime">-</span></p>
     <canvas id="mapCanvas"></canvas>
     <div id="weatherDataContainer">
         <h2>Stacje pogodowe</h2>
@@ -41,7 +43,7 @@ html_template = f"""
             <thead>
                 <tr>
                     <th>Identyfikator</th>
-                    <th>Czas</th>
+                    <th>Czas odczytu</th>
                     <th>Temperatura (°C)</th>
                     <th>Wiatr (km/h)</th>
                     <th>Mgła</th>
@@ -87,22 +89,16 @@ html_template = f"""
             ctx.closePath();
         }}
 
-        // Funkcja do rysowania mapy
-        async function drawMap() {{
-            const canvas = document.getElementById("mapCanvas");
-            const ctx = canvas.getContext("2d");
-
-            const mapImage = new Image();
-            mapImage.src = mapImageSrc;
-            await new Promise(resolve => mapImage.onload = resolve);
-
-            canvas.width = mapImage.width;
-            canvas.height = mapImage.height;
+        const staticData = {json.dumps(static_data)};
+        const mapImage = new Image();
+        const mapLoaded = new Promise(resolve => mapImage.onload = resolve);
+        mapImage.src = mapImageSrc;
+        let animalRoutes = [];
 
+        // Tło, trasy, detektory, stacje BTS i miejsca specjalne - wspólne dla każdego kroku
+        function drawStatic(ctx) {{
             ctx.drawImage(mapImage, 0, 0);
 
-            // Wczytaj dane statyczne z map_sample.json
-            const staticData = {json.dumps(static_data)};
             staticData.routes.forEach(route => {{
                 const points = route.points;
                 const lineColor = route.color;
@@ -136,26 +132,6 @@ html_template = f"""
                 ctx.closePath();
             }});
 
-            // Wczytaj dane dynamiczne z plików JSON
-            const locationsResponse = await fetch("animal_locations.json");
-            const routesResponse = await fetch("animal_routes.json");
-
-            const animalLocations = await locationsResponse.json();
-            const animalRoutes = await routesResponse.json();
-
-            const locationsResponseT = await fetch("tourist_location.json");
-            const touristLocations = await locationsResponseT.json();
-
-            // Rysowanie lokalizacji zwierząt
-            animalLocations.forEach(location => {{
-                drawPoint(ctx, parseFloat(location.location.longitude), parseFloat(location.location.latitude), "blue", 5, location.animalId);
-            }});
-
-            // Rysowanie lokalizacji turystów
-            touristLocations.forEach(location => {{
-                drawPoint(ctx, parseFloat(location.location.longitude), parseFloat(location.location.latitude), "red", 5, location.PhoneId);
-            }});
-
             // Rysowanie tras zwierząt
             animalRoutes.forEach(route => {{
                 const points = route.route.map(r => ({{
@@ -169,38 +145,73 @@ html_template = f"""
             }});
         }}
 
-        // Funkcja do załadowania danych pogodowych i uzupełnienia tabeli
-async function populateWeatherTable() {{
-    const response = await fetch("weather_data.json");
-    const weatherData = await response.json();
+        // Funkcja do rysowania mapy dla stanu kroku przesłanego przez symulację
+        async function drawMap(state) {{
+            await mapLoaded;
+            const canvas = document.getElementById("mapCanvas");
+            const ctx = canvas.getContext("2d");
+            canvas.width = mapImage.width;
+            canvas.height = mapImage.height;
+            drawStatic(ctx);
 
-    const tableBody = document.querySelector("#weatherTable tbody");
-    tableBody.innerHTML = ""; // Wyczyść zawartość tabeli przed aktualizacją
+            // Rysowanie lokalizacji zwierząt
+            state.animals.forEach(location => {{
+                drawPoint(ctx, location.longitude, location.latitude, "blue", 5, location.animal_id);
+            }});
 
-    weatherData.forEach(station => {{
-        const row = document.createElement("tr");
+            // Rysowanie lokalizacji turystów
+            state.tourists.forEach(location => {{
+                drawPoint(ctx, parseFloat(location.location.longitude), parseFloat(location.location.latitude), "red", 5, location.PhoneId);
+            }});
+        }}
 
-        row.innerHTML = `
-        <td>${{station.detectorNumber}}</td>
-        <td>${{station.coordinates.latitude}}, ${{station.coordinates.longitude}}</td>
-        <td>${{station.weather.temperature}}</td>
-        <td>${{station.weather.wind}}</td>
-        <td>${{station.weather.fog}}</td>
-        <td>${{station.weather.rain}}</td>
-    `;
+        // Funkcja do uzupełnienia tabeli danymi pogodowymi kroku
+        function populateWeatherTable(state) {{
+            const tableBody = document.querySelector("#weatherTable tbody");
+            tableBody.innerHTML = ""; // Wyczyść zawartość tabeli przed aktualizacją
 
-        tableBody.appendChild(row);
-    }});
-}}
+            state.weather.forEach(station => {{
+                const row = document.createElement("tr");
 
-// Wywołanie funkcji przy ładowaniu strony
-populateWeatherTable();
-setInterval(populateWeatherTable, 10000); // Aktualizacja danych co 10 sekund
+                row.innerHTML = `
+                <td>${{station.stationId}}</td>
+                <td>${{station.timeStamp}}</td>
+                <td>${{station.temperature}}</td>
+                <td>${{station.wind}}</td>
+                <td>${{station.fog}}</td>
+                <td>${{station.rain}}</td>
+            `;
 
+                tableBody.appendChild(row);
+            }});
+        }}
 
-        // Aktualizacja mapy co 10 sekund
-        drawMap();
-        setInterval(drawMap, 10000);
+        function showState(state) {{
+            document.getElementById("simulatedTime").textContent = state.simulated_time;
+            drawMap(state);
+            populateWeatherTable(state);
+        }}
+
+        // Trasy zwierząt są stałe w trakcie przebiegu - wczytujemy je raz
+        fetch("animal_routes.json")
+            .then(response => response.ok ? response.json() : [])
+            .then(routes => animalRoutes = routes)
+            .catch(() => {{}})
+            .finally(() => {{
+                if (window.EventSource) {{
+                    // Symulacja wypycha stan każdego kroku
+                    const events = new EventSource("/events");
+                    events.onmessage = event => showState(JSON.parse(event.data));
+                }} else {{
+                    // Starsze przeglądarki: odpytywanie co sekundę (304, gdy stan się nie zmienił)
+                    setInterval(async () => {{
+                        const response = await fetch("/state");
+                        if (response.status === 200) {{
+                            showState(await response.json());
+                        }}
+                    }}, 1000);
+                }}
+            }});
     </script>
 </body>
 </html>